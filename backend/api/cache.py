@@ -0,0 +1,149 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from .conditional import bump_version, get_versions
+from .renderers import EncodedJSON, ORJSONRenderer
+
+
+class LocMemLRUBackend:
+    """Кэш в памяти процесса: LRU с ограничением числа записей и TTL."""
+
+    def __init__(self, max_entries=1000, timeout=60):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+
+class DjangoCacheBackend:
+    """Кэш из CACHES, например общий RedisCache для всех воркеров.
+
+    Вытеснением занимается сам кэш, поэтому оно здесь не считается.
+    """
+
+    evictions = 0
+
+    def __init__(self, alias='default', timeout=60):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+
+class ResponseCache:
+    """Кэш данных ответов с инвалидацией по версиям групп.
+
+    Ключ записи включает версии групп, от которых зависит ответ
+    (рецепт, автор, тег, все рецепты). Изменение данных повышает
+    версию группы, и старые записи больше не находятся, а со временем
+    вытесняются.
+    """
+
+    def __init__(self, prefix, backend=None, **options):
+        self.prefix = prefix
+        self.backend_path = backend
+        self.options = options
+        self.hits = 0
+        self.misses = 0
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            config = settings.RESPONSE_CACHE
+            backend_class = import_string(
+                self.backend_path or config['BACKEND']
+            )
+            self._backend = backend_class(
+                **{**config.get('OPTIONS', {}), **self.options}
+            )
+        return self._backend
+
+    def make_key(self, params, groups):
+        versions = get_versions(
+            *(f'{self.prefix}:{group}' for group in groups)
+        )
+        content = json.dumps([params, versions], sort_keys=True)
+        digest = hashlib.md5(content.encode()).hexdigest()
+        return f'{self.prefix}:{digest}'
+
+    def invalidate(self, *groups):
+        bump_version(*(f'{self.prefix}:{group}' for group in groups))
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+        }
+
+
+recipe_cache = ResponseCache('recipes')
+
+
+class EncodedResponseCache:
+    """Закодированные в JSON справочники, общие для всех запросов.
+
+    Байты хранятся в памяти процесса вместе с версиями таблиц, из
+    которых собраны, и кодируются заново, только когда версии
+    изменились. Поэтому кэш годится, только если версии общие для
+    всех процессов (versions_are_shared).
+    """
+
+    def __init__(self):
+        self._items = {}
+
+    def get(self, name, models, build):
+        versions = get_versions(*models)
+        item = self._items.get(name)
+        if item is None or item[0] != versions:
+            item = (versions, EncodedJSON(ORJSONRenderer().render(build())))
+            self._items[name] = item
+        return item[1]
+
+
+reference_json = EncodedResponseCache()
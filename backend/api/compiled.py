@@ -0,0 +1,147 @@
+from collections.abc import Mapping
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.manager import BaseManager
+from rest_framework import fields, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+
+# Поля, у которых to_representation сводится к приведению типа.
+CONVERTERS = {
+    fields.CharField.to_representation: str,
+    fields.IntegerField.to_representation: int,
+}
+
+
+def identity(value):
+    return value
+
+
+def is_required_fk(model_field):
+    return model_field.many_to_one and not model_field.null
+
+
+def make_related_getter(name):
+    """Берёт предзагруженный prefetch_related список без менеджера."""
+    def get_related(instance):
+        cache = getattr(instance, '_prefetched_objects_cache', {})
+        if name in cache:
+            return cache[name]
+        return getattr(instance, name).all()
+
+    return get_related
+
+
+def make_getter(field, model):
+    """Быстрый доступ к источнику поля или None, если он не подходит.
+
+    Подходят поля модели и обязательные FK (в том числе цепочкой) —
+    они не бывают вызываемыми и не бросают исключений, поэтому общий
+    Field.get_attribute для них не нужен, — а также связи «ко многим»
+    у вложенных списков. Поля со своим get_attribute не ускоряются.
+    """
+    if model is None or field.source == '*':
+        return None
+    if (
+        not isinstance(field, serializers.ListSerializer)
+        and type(field).get_attribute is not fields.Field.get_attribute
+    ):
+        return None
+    *relations, name = field.source_attrs
+    try:
+        for relation in relations:
+            model_field = model._meta.get_field(relation)
+            if not is_required_fk(model_field):
+                return None
+            model = model_field.related_model
+        if name == 'pk':
+            return attrgetter(field.source)
+        model_field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if isinstance(field, serializers.ListSerializer):
+        if relations or not (
+            model_field.many_to_many or model_field.one_to_many
+        ):
+            return None
+        return make_related_getter(name)
+    if model_field.is_relation and not is_required_fk(model_field):
+        return None
+    return attrgetter(field.source)
+
+
+def compile_list(serializer):
+    represent = compile_serializer(serializer)
+
+    def represent_list(data):
+        if isinstance(data, BaseManager):
+            data = data.all()
+        return [represent(item) for item in data]
+
+    return represent_list
+
+
+def compile_field(field, model):
+    if isinstance(field, serializers.ListSerializer):
+        convert = compile_list(field.child)
+    elif isinstance(field, serializers.BaseSerializer):
+        convert = compile_serializer(field)
+    elif isinstance(field, fields.ReadOnlyField):
+        convert = identity
+    else:
+        convert = CONVERTERS.get(
+            type(field).to_representation, field.to_representation
+        )
+    return make_getter(field, model), field.get_attribute, convert
+
+
+def compile_serializer(serializer):
+    """Собирает функцию instance -> dict, равную to_representation.
+
+    Поля, источники и преобразования разбираются один раз на список,
+    а не для каждой строки. instance может быть объектом модели или
+    словарём из .values().
+    """
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    plan = [
+        (field.field_name, *compile_field(field, model))
+        for field in serializer._readable_fields
+    ]
+
+    def represent(instance):
+        result = {}
+        is_mapping = isinstance(instance, Mapping)
+        for name, fast_get, get, convert in plan:
+            if fast_get is None or is_mapping:
+                try:
+                    attribute = get(instance)
+                except SkipField:
+                    continue
+                if isinstance(attribute, PKOnlyObject):
+                    check_for_none = attribute.pk
+                else:
+                    check_for_none = attribute
+            else:
+                attribute = check_for_none = fast_get(instance)
+            result[name] = (
+                None if check_for_none is None else convert(attribute)
+            )
+        return result
+
+    return represent
+
+
+class CompiledListSerializer(serializers.ListSerializer):
+    """ListSerializer с заранее собранным планом полей.
+
+    Включается настройкой COMPILED_SERIALIZERS; результат совпадает
+    с обычным ListSerializer, вложенные сериализаторы тоже
+    разбираются один раз на весь список.
+    """
+
+    def to_representation(self, data):
+        if not settings.COMPILED_SERIALIZERS:
+            return super().to_representation(data)
+        return compile_list(self.child)(data)
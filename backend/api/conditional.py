@@ -0,0 +1,123 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import transaction
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+
+VERSION_KEY = 'table_version:{}'
+# В этих кэшах у каждого процесса свои версии: остальные воркеры не
+# узнали бы об изменениях и продолжали бы отвечать 304.
+PER_PROCESS_CACHES = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def versions_are_shared():
+    return settings.CACHES['default']['BACKEND'] not in PER_PROCESS_CACHES
+
+
+def check_versions_cache(**kwargs):
+    if versions_are_shared():
+        return []
+    return [checks.Warning(
+        'ETag и Last-Modified отключены: версии таблиц хранятся в '
+        'кэше отдельного процесса.',
+        hint='Задайте REDIS_URL, чтобы включить ответы 304.',
+        id='api.W001',
+    )]
+
+
+def make_version():
+    return time.time_ns() // 1000
+
+
+def get_version_key(source):
+    if isinstance(source, str):
+        return VERSION_KEY.format(source)
+    return VERSION_KEY.format(source._meta.label_lower)
+
+
+def get_versions(*sources):
+    """Версии таблиц моделей или именованных групп данных.
+
+    Версия — время последнего изменения в микросекундах.
+    """
+    keys = [get_version_key(source) for source in sources]
+    versions = cache.get_many(keys)
+    missing = {key: make_version() for key in keys if key not in versions}
+    if missing:
+        # Версия неизвестна (например, после очистки кэша) — считаем,
+        # что данные изменились сейчас.
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_version(*sources):
+    """Обновляет версии после коммита текущей транзакции.
+
+    Иначе параллельный запрос успел бы закэшировать ещё старые данные
+    под новой версией, и они отдавались бы до следующего изменения.
+    """
+    keys = [get_version_key(source) for source in sources]
+
+    def set_versions():
+        versions = cache.get_many(keys)
+        version = make_version()
+        cache.set_many(
+            {key: max(version, versions.get(key, 0) + 1) for key in keys},
+            None,
+        )
+
+    transaction.on_commit(set_versions)
+
+
+def versioned_etag(*models, per_user=False):
+    def etag_func(request, *args, **kwargs):
+        if not versions_are_shared():
+            return None
+        # Полный путь: у разных query string разные представления.
+        parts = [
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            *map(str, get_versions(*models)),
+        ]
+        if per_user or request.user.is_authenticated:
+            parts.append(str(request.user.pk))
+        return hashlib.md5(':'.join(parts).encode()).hexdigest()
+    return etag_func
+
+
+def versioned_last_modified(*models):
+    def last_modified_func(request, *args, **kwargs):
+        if not versions_are_shared():
+            return None
+        return datetime.fromtimestamp(
+            max(get_versions(*models)) / 10 ** 6, tz=timezone.utc
+        )
+    return last_modified_func
+
+
+def conditional(*models, per_user=False):
+    """Декораторы для ответов 304 по версиям таблиц models.
+
+    ETag учитывает полный путь с query string и id вошедшего
+    пользователя; если ответ зависит от пользователя, он получает
+    Vary: Authorization. Без общего кэша версий валидаторов нет и
+    ответы отдаются целиком.
+    """
+    decorators = [
+        condition(
+            etag_func=versioned_etag(*models, per_user=per_user),
+            last_modified_func=versioned_last_modified(*models),
+        )
+    ]
+    if per_user:
+        decorators.insert(0, vary_on_headers('Authorization'))
+    return decorators
@@ -0,0 +1,176 @@
+import base64
+import binascii
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile
+)
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+
+# Кратно 4, чтобы куски Base64 декодировались независимо.
+BASE64_CHUNK_SIZE = 64 * 1024
+# Сколько байт начала файла можно прочитать в поисках заголовка.
+MAX_HEADER_SIZE = 1024 * 1024
+
+
+def iter_base64(data, start=0):
+    """Декодирует Base64 по кускам, пропуская пробелы и переводы строк."""
+    rest = ''
+    for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+        chunk = rest + ''.join(
+            data[offset:offset + BASE64_CHUNK_SIZE].split()
+        )
+        end = len(chunk) - len(chunk) % 4
+        rest = chunk[end:]
+        yield base64.b64decode(chunk[:end], validate=True)
+    if rest:
+        raise binascii.Error('Incorrect padding')
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """Base64ImageField, не собирающий файл целиком в памяти.
+
+    Строка декодируется кусками: пока файл меньше
+    FILE_UPLOAD_MAX_MEMORY_SIZE, он остаётся в памяти, дальше
+    переносится во временный файл на диске, как при обычной загрузке.
+    Размер проверяется по длине строки ещё до декодирования, формат и
+    число пикселей — по заголовку, до декодирования остального файла.
+    """
+
+    ALLOWED_FORMATS = {
+        'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'
+    }
+    default_error_messages = {
+        'too_large': 'Размер изображения больше {max_size} МБ.',
+        'too_many_pixels': (
+            'Изображение больше {max_pixels} мегапикселей.'
+        ),
+    }
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            return super().to_internal_value(base64_data)
+        # Срез строки копировал бы её, поэтому дальше работаем по смещению.
+        header_end = base64_data.find(';base64,', 0, 256)
+        start = 0 if header_end == -1 else header_end + len(';base64,')
+        content_type = None
+        if header_end != -1 and self.trust_provided_content_type:
+            content_type = base64_data[:header_end].replace('data:', '')
+        if (len(base64_data) - start) // 4 * 3 > self.max_size:
+            self.fail_too_large()
+        try:
+            upload = self.decode(base64_data, start, content_type)
+        except (TypeError, binascii.Error, ValueError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        return serializers.ImageField.to_internal_value(self, upload)
+
+    @property
+    def max_size(self):
+        return settings.IMAGE_MAX_UPLOAD_SIZE
+
+    def fail_too_large(self):
+        self.fail('too_large', max_size=self.max_size // (1024 * 1024))
+
+    def fail_too_many_pixels(self):
+        self.fail(
+            'too_many_pixels', max_pixels=settings.IMAGE_MAX_PIXELS // 10 ** 6
+        )
+
+    def check_header(self, head):
+        """Расширение файла по заголовку или None, если данных мало."""
+        try:
+            with Image.open(BytesIO(head)) as image:
+                image_format, (width, height) = image.format, image.size
+        except Image.DecompressionBombError:
+            self.fail_too_many_pixels()
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            if len(head) >= MAX_HEADER_SIZE:
+                raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+            return None
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            self.fail_too_many_pixels()
+        if image_format not in self.ALLOWED_FORMATS:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        return self.ALLOWED_FORMATS[image_format]
+
+    def decode(self, data, start, content_type):
+        head = BytesIO()
+        extension = None
+        file = None
+        size = 0
+        for chunk in iter_base64(data, start):
+            size += len(chunk)
+            if size > self.max_size:
+                self.fail_too_large()
+            if extension is None:
+                head.write(chunk)
+                extension = self.check_header(head.getvalue())
+                if extension is None:
+                    continue
+                name = f'{uuid.uuid4()}.{extension}'
+                file = InMemoryUploadedFile(
+                    BytesIO(), None, name, content_type, 0, None
+                )
+                chunk = head.getvalue()
+                head = None
+            if (
+                isinstance(file, InMemoryUploadedFile)
+                and size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+            ):
+                buffer = file.file.getvalue()
+                file = TemporaryUploadedFile(name, content_type, 0, None)
+                file.write(buffer)
+            file.write(chunk)
+        if file is None:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        file.size = size
+        file.seek(0)
+        return file
+
+
+class ThumbnailMixin:
+    """В списках отдаёт миниатюру вместо полного изображения.
+
+    Поле считается частью списка, если среди родительских
+    сериализаторов есть ListSerializer. Пока миниатюра не готова,
+    отдаётся исходное изображение.
+    """
+
+    def __init__(self, *args, thumbnail_source, **kwargs):
+        self.thumbnail_source = thumbnail_source
+        super().__init__(*args, **kwargs)
+
+    @property
+    def in_list(self):
+        parent = self.parent
+        while parent is not None:
+            if isinstance(parent, serializers.ListSerializer):
+                return True
+            parent = parent.parent
+        return False
+
+    def bind(self, field_name, parent):
+        super().bind(field_name, parent)
+        self.use_thumbnail = self.in_list
+
+    def get_attribute(self, instance):
+        if self.use_thumbnail:
+            thumbnail = getattr(instance, self.thumbnail_source, None)
+            if thumbnail:
+                return thumbnail
+        return super().get_attribute(instance)
+
+
+class ThumbnailImageField(ThumbnailMixin, serializers.ImageField):
+    pass
+
+
+class Base64ThumbnailImageField(ThumbnailMixin, StreamingBase64ImageField):
+    pass
@@ -1,16 +1,35 @@
+from django.db.models import Case, Value, When
+from django.db.models.functions import Lower
 from django_filters import rest_framework as filters
 
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes
+
+POPULAR_ORDERING = ('-favorites_count', '-pub_date', '-id')
 
 
 class IngredientFilter(filters.FilterSet):
 
-    name = filters.CharFilter(lookup_expr='istartswith')
+    name = filters.CharFilter(method='filter_by_name')
 
     class Meta:
         model = Ingredient
         fields = ['name']
 
+    def filter_by_name(self, queryset, name, value):
+        value = value.lower()
+        return (
+            queryset.alias(name_lower=Lower('name'))
+            .filter(name_lower__contains=value)
+            .annotate(
+                is_contains_match=Case(
+                    When(name_lower__startswith=value, then=Value(False)),
+                    default=Value(True),
+                )
+            )
+            .order_by('is_contains_match', 'name_lower', 'id')
+        )
+
 
 class RecipeFilter(filters.FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
@@ -18,6 +37,11 @@ class RecipeFilter(filters.FilterSet):
         to_field_name='slug',
         queryset=Tag.objects.all(),
     )
+    search = filters.CharFilter(method='filter_by_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'Сначала популярные'),),
+        method='filter_by_ordering',
+    )
     is_favorited = filters.BooleanFilter(method='filter_by_user_favorites')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_by_user_shopping_cart'
@@ -25,7 +49,16 @@ class RecipeFilter(filters.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+            'search', 'ordering',
+        ]
+
+    def filter_by_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_by_ordering(self, queryset, name, value):
+        return queryset.order_by(*POPULAR_ORDERING)
 
     def filter_by_user_favorites(self, queryset, name, value):
         return self.filter_by_user_relationship(queryset, value, 'favorites')
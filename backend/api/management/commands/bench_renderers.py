@@ -0,0 +1,87 @@
+from time import perf_counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.cache import EncodedResponseCache
+from api.renderers import ORJSONRenderer
+from api.serializers import (
+    IngredientSerializer,
+    RecipeReadSerializer,
+    TagSerializer
+)
+from recipes.models import Ingredient, Recipe, Tag
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить время рендеринга JSON стандартным JSONRenderer, '
+        'ORJSONRenderer и готовыми байтами справочников.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int, default=100,
+            help='Сколько рецептов в странице.',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз повторять замер.',
+        )
+
+    def handle(self, *args, **options):
+        request = Request(RequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        context = {'request': request}
+        recipes = Recipe.objects.for_reading(request.user)[:options['size']]
+        payloads = (
+            ('tags', Tag, TagSerializer),
+            ('ingredients', Ingredient, IngredientSerializer),
+            ('recipes', None, RecipeReadSerializer),
+        )
+        self.stdout.write(
+            f'{"ответ":<12} {"объектов":>8} {"КБ":>8} {"json, мс":>9} '
+            f'{"orjson, мс":>10} {"байты, мс":>10}'
+        )
+        for name, model, serializer_class in payloads:
+            queryset = recipes if model is None else model.objects.all()
+            data = serializer_class(queryset, many=True, context=context).data
+            json_time, expected = self.measure(
+                lambda: JSONRenderer().render(data), options['repeat']
+            )
+            orjson_time, content = self.measure(
+                lambda: ORJSONRenderer().render(data), options['repeat']
+            )
+            if content != expected:
+                raise CommandError(f'{name}: JSON отличается.')
+            encoded_time = '—'
+            if model is not None:
+                # Первый вызов кодирует список, дальше берутся байты.
+                cache = EncodedResponseCache()
+                cache.get(name, (model,), lambda: data)
+                encoded_time, content = self.measure(
+                    lambda: ORJSONRenderer().render(
+                        cache.get(name, (model,), lambda: data)
+                    ),
+                    options['repeat'],
+                )
+                if content != expected:
+                    raise CommandError(f'{name}: готовые байты отличаются.')
+                encoded_time = f'{encoded_time:.3f}'
+            self.stdout.write(
+                f'{name:<12} {len(data):>8} {len(expected) / 1024:>8.1f} '
+                f'{json_time:>9.3f} {orjson_time:>10.3f} {encoded_time:>10}'
+            )
+
+    @staticmethod
+    def measure(render, repeat):
+        best = None
+        for _ in range(repeat):
+            start = perf_counter()
+            content = render()
+            elapsed = (perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, content
@@ -0,0 +1,84 @@
+from time import perf_counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.serializers import (
+    IngredientSerializer,
+    RecipeReadSerializer,
+    RecipeShortSerializer,
+    TagSerializer
+)
+from recipes.models import Ingredient, Recipe, Tag
+
+SERIALIZERS = (
+    ('RecipeReadSerializer', RecipeReadSerializer, 'recipes'),
+    ('RecipeShortSerializer', RecipeShortSerializer, 'recipes'),
+    ('TagSerializer', TagSerializer, 'tags'),
+    ('IngredientSerializer', IngredientSerializer, 'ingredients'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить обычные и скомпилированные сериализаторы списков '
+        'на объектах из БД.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', type=int, default=100,
+            help='Сколько объектов сериализовать за раз.',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз повторять замер.',
+        )
+
+    def handle(self, *args, **options):
+        size = options['size']
+        request = Request(RequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        data = {
+            'recipes': list(Recipe.objects.for_reading(request.user)[:size]),
+            'tags': list(Tag.objects.all()[:size]),
+            'ingredients': list(Ingredient.objects.all()[:size]),
+        }
+        if not data['recipes']:
+            raise CommandError('В БД нет рецептов для замера.')
+        self.stdout.write(
+            f'{"сериализатор":<22} {"объектов":>8} {"DRF, мс":>9} '
+            f'{"план, мс":>9} {"ускорение":>9}'
+        )
+        for name, serializer_class, key in SERIALIZERS:
+            objects = data[key]
+            results = {}
+            for compiled in (False, True):
+                with override_settings(COMPILED_SERIALIZERS=compiled):
+                    results[compiled] = self.measure(
+                        serializer_class, objects, request, options['repeat']
+                    )
+            (drf_time, drf_json), (plan_time, plan_json) = (
+                results[False], results[True]
+            )
+            if drf_json != plan_json:
+                raise CommandError(f'{name}: JSON отличается.')
+            self.stdout.write(
+                f'{name:<22} {len(objects):>8} {drf_time:>9.2f} '
+                f'{plan_time:>9.2f} {drf_time / plan_time:>8.1f}x'
+            )
+
+    @staticmethod
+    def measure(serializer_class, objects, request, repeat):
+        best = None
+        for _ in range(repeat):
+            start = perf_counter()
+            data = serializer_class(
+                objects, many=True, context={'request': request}
+            ).data
+            elapsed = (perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, JSONRenderer().render(data)
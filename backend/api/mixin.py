@@ -1,7 +1,14 @@
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.response import Response
 
+from recipes.signals import batch_changes, user_lists_changed
+from users.models import User
+from .cache import reference_json
+from .conditional import versions_are_shared
+from .renderers import ORJSONRenderer
+
 
 class AddRemoveMixin:
     serializer_class = None
@@ -19,8 +26,10 @@ class AddRemoveMixin:
         }
 
         serializer = self.serializer_class(data=data, context=context)
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            self.lock_user(user)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -28,11 +37,147 @@ class AddRemoveMixin:
         instance = get_object_or_404(self.model, id=pk)
         user = request.user
 
-        obj = get_object_or_404(
-            self.related_model,
-            user=user,
-            **{self.model_field: instance}
+        with transaction.atomic():
+            self.lock_user(user)
+            obj = get_object_or_404(
+                self.related_model,
+                user=user,
+                **{self.model_field: instance}
+            )
+            obj.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @staticmethod
+    def lock_user(user):
+        # Списки одного пользователя меняются по очереди: иначе пакетный
+        # запрос посчитал бы новым рецепт, добавленный параллельно.
+        User.objects.select_for_update().only('pk').get(pk=user.pk)
+
+    def change_list(self, request, add):
+        """Добавляет или убирает пачку объектов за одну транзакцию.
+
+        Новые связи вставляются одним bulk_create(ignore_conflicts=True),
+        лишние удаляются одним delete(). Построчные получатели сигналов
+        внутри batch_changes() молчат, а счётчики, список покупок и
+        версии обновляет получатель user_lists_changed. Ответ — статус
+        каждого id: added/exists или removed/missing, а также not_found.
+        """
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        user = request.user
+        field = f'{self.model_field}_id'
+        with transaction.atomic():
+            self.lock_user(user)
+            found = set(
+                self.model.objects.filter(id__in=ids)
+                .values_list('id', flat=True)
+            )
+            rows = self.related_model.objects.filter(
+                user=user, **{f'{field}__in': found}
+            )
+            present = set(rows.values_list(field, flat=True))
+            with batch_changes():
+                if add:
+                    changed = [pk for pk in ids if pk in found - present]
+                    self.related_model.objects.bulk_create(
+                        [
+                            self.related_model(user=user, **{field: pk})
+                            for pk in changed
+                        ],
+                        ignore_conflicts=True,
+                    )
+                else:
+                    changed = [pk for pk in ids if pk in present]
+                    rows.delete()
+            if changed:
+                user_lists_changed.send(
+                    sender=self.related_model, user_id=user.pk,
+                    recipe_ids=changed, added=add,
+                )
+        statuses = ('added', 'exists') if add else ('missing', 'removed')
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': statuses[pk in present] if pk in found
+                else 'not_found',
+            }
+            for pk in ids
+        ]})
+
+    def add_many_to_list(self, request):
+        return self.change_list(request, add=True)
+
+    def remove_many_from_list(self, request):
+        return self.change_list(request, add=False)
+
+
+class AnonymousCacheMixin:
+    """Кэширует ответы анонимным пользователям в response_cache.
+
+    Ответ кэшируется, только если в запросе нет параметров, кроме
+    cache_query_params и ignored_query_params (последние не влияют на
+    ответ анонимному пользователю).
+    """
+
+    response_cache = None
+    cache_query_params = ()
+    ignored_query_params = ()
+
+    def get_cache_groups(self, params):
+        raise NotImplementedError
+
+    def get_cache_params(self):
+        query_params = self.request.query_params
+        allowed = {*self.cache_query_params, *self.ignored_query_params}
+        if not allowed.issuperset(query_params):
+            return None
+        return {
+            name: sorted(set(query_params.getlist(name)))
+            for name in self.cache_query_params if name in query_params
+        }
+
+    def cached_response(self, view, request, *args, **kwargs):
+        params = self.get_cache_params()
+        if not request.user.is_anonymous or params is None:
+            return view(request, *args, **kwargs)
+
+        key = self.response_cache.make_key(
+            {
+                'action': self.action,
+                'base_url': request.build_absolute_uri('/'),
+                'kwargs': kwargs,
+                'params': params,
+            },
+            self.get_cache_groups(params),
         )
+        data = self.response_cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            self.response_cache.set(key, response.data)
+        return response
 
-        obj.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ReferenceJSONMixin:
+    """Полный список справочника из готовых байтов reference_json.
+
+    Байты подходят только ORJSONRenderer, поэтому для других форматов
+    (например, browsable API) encoded_list возвращает None и список
+    собирается как обычно. Так же и без общего кэша версий: запись в
+    другом процессе не изменила бы версии этого, и байты устарели бы.
+    """
+
+    def encoded_list(self):
+        if not versions_are_shared() or not isinstance(
+            self.request.accepted_renderer, ORJSONRenderer
+        ):
+            return None
+        model = self.queryset.model
+        return Response(reference_json.get(
+            model._meta.label_lower, (model,), self.serialize_list
+        ))
+
+    def serialize_list(self):
+        return self.get_serializer(self.get_queryset(), many=True).data
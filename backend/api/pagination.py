@@ -1,4 +1,181 @@
+import heapq
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.search import SEARCH_RANK
+
+
+class ApproximateCountPaginator(Paginator):
+    """Для больших таблиц без фильтров берёт число строк из pg_class.
+
+    Точный COUNT(*) читает всю таблицу; оценка планировщика обновляется
+    ANALYZE/autovacuum и для номеров страниц достаточно точна.
+    """
+
+    @cached_property
+    def count(self):
+        threshold = settings.APPROXIMATE_COUNT_THRESHOLD
+        query = getattr(self.object_list, 'query', None)
+        if (
+            threshold and query is not None and not query.where
+            and not query.distinct and connection.vendor == 'postgresql'
+        ):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE oid = %s::regclass',
+                    [self.object_list.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row is not None and row[0] >= threshold:
+                return row[0]
+        return super().count
+
+
+class KeysetPagination:
+    """Постраничный вывод по курсору без COUNT и OFFSET.
+
+    Курсор хранит значения полей сортировки последнего (или первого,
+    для предыдущей страницы) объекта, следующая страница выбирается
+    условием «после этих значений», которое покрывает индекс. Порядок
+    задаёт атрибут cursor_ordering представления; последним полем в
+    нём должно быть уникальное, например id.
+    """
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    @staticmethod
+    def get_field(ordering):
+        return ordering.lstrip('-')
+
+    def encode_cursor(self, obj, reverse):
+        values = [
+            str(getattr(obj, self.get_field(field)))
+            for field in self.ordering
+        ]
+        payload = json.dumps({'v': values, 'r': reverse}).encode()
+        cursor = urlsafe_b64encode(payload).decode().rstrip('=')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(
+                urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            )
+            values, reverse = payload['v'], bool(payload['r'])
+        except (BinasciiError, TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def get_position_filter(self, values, reverse):
+        """(a, b) после (x, y): a > x OR (a = x AND b > y)."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = self.get_field(field)
+            after = field.startswith('-') == reverse
+            lookup = 'gt' if after else 'lt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def prepare(self, request, view):
+        self.ordering = view.cursor_ordering
+        self.base_url = request.build_absolute_uri()
+        self.values, self.reverse = self.decode_cursor(request)
+
+    def apply(self, queryset):
+        """Сортирует queryset и отбрасывает объекты до курсора."""
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering
+            ]
+        queryset = queryset.order_by(*ordering)
+        if self.values is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_position_filter(self.values, self.reverse)
+                )
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return queryset
+
+    def make_page(self, page):
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if self.reverse:
+            page.reverse()
+        self.next = self.previous = None
+        if page:
+            if has_more or self.reverse:
+                self.next = self.encode_cursor(page[-1], False)
+            if self.values is not None and (has_more or not self.reverse):
+                self.previous = self.encode_cursor(page[0], True)
+        elif self.values is not None:
+            self.previous = remove_query_param(
+                self.base_url, self.cursor_query_param
+            )
+        return page
+
+    def paginate_queryset(self, queryset, request, view):
+        self.prepare(request, view)
+        return self.make_page(
+            list(self.apply(queryset)[:self.page_size + 1])
+        )
+
+    def paginate_streams(self, querysets, request, view):
+        """Страница из слияния нескольких отсортированных потоков.
+
+        Из каждого queryset берётся не больше страницы после курсора
+        (дешёвый запрос по индексу), потоки сливаются heapq.merge.
+        Все поля cursor_ordering должны сортироваться в одну сторону.
+        """
+        self.prepare(request, view)
+        fields = [self.get_field(field) for field in self.ordering]
+        descending = self.ordering[0].startswith('-') != self.reverse
+        streams = [
+            list(self.apply(queryset).only(*fields)[:self.page_size + 1])
+            for queryset in querysets
+        ]
+        merged = heapq.merge(
+            *streams,
+            key=lambda obj: [getattr(obj, field) for field in fields],
+            reverse=descending,
+        )
+        return self.make_page(list(islice(merged, self.page_size + 1)))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next,
+            'previous': self.previous,
+            'results': data,
+        })
 
 
 class CustomPagination(PageNumberPagination):
@@ -6,3 +183,25 @@ class CustomPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     page_size_query_param = 'limit'
     max_page_size = 100
+    django_paginator_class = ApproximateCountPaginator
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Курсорный режим включается параметром ?cursor= (пустое
+        # значение — первая страница) у представлений с cursor_ordering.
+        # Результаты поиска отсортированы по релевантности, которой нет
+        # в cursor_ordering, поэтому они всегда листаются по номерам.
+        if (
+            KeysetPagination.cursor_query_param in request.query_params
+            and getattr(view, 'cursor_ordering', None)
+            and hasattr(queryset, 'order_by')
+            and SEARCH_RANK not in queryset.query.annotations
+        ):
+            self.keyset = KeysetPagination(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
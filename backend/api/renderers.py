@@ -0,0 +1,77 @@
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+
+class EncodedJSON(bytes):
+    """Уже закодированный JSON: ORJSONRenderer отдаёт его как есть."""
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с тем же выводом.
+
+    Типы, которых orjson не знает (Decimal, ленивые строки перевода),
+    и datetime, чтобы UTC записывался через Z, кодирует JSONEncoder
+    DRF. Ответы с отступами (browsable API), с ensure_ascii или с тем,
+    что orjson не кодирует (целые больше 64 бит), собирает обычный
+    JSONRenderer.
+    """
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent or self.ensure_ascii or not self.compact:
+            if isinstance(data, EncodedJSON):
+                data = orjson.loads(data)
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if isinstance(data, EncodedJSON):
+            return bytes(data)
+        try:
+            ret = orjson.dumps(data, default=self.default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        # Как и JSONRenderer, экранируем разделители строк для JavaScript.
+        if LINE_SEPARATOR in ret or PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028')
+            ret = ret.replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Выбор формата выгрузки списка покупок.
+
+    Сам список отдаётся из представления файлом или потоком,
+    через рендерер проходят только ответы с ошибками.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data)
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
@@ -1,7 +1,7 @@
 import djoser.serializers
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SerializerMethodField
@@ -13,18 +13,32 @@ from recipes.models import (
     IngredientToRecipe,
     Recipe,
     ShopList,
-    Tag
+    ShopListIngredient,
+    Tag,
+    make_text_hash
 )
+from recipes.signals import ingredients_changed
 from users.models import User
-from linklite.models import URL
+from linklite.models import URL, make_url_digest
+from .compiled import CompiledListSerializer
+from .fields import (
+    Base64ThumbnailImageField,
+    StreamingBase64ImageField,
+    ThumbnailImageField
+)
 
 
 MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 2880
+RECIPE_BATCH_MAX_SIZE = 100
 
 
 class UserSerializer(djoser.serializers.UserSerializer):
     is_subscribed = SerializerMethodField(read_only=True)
+    avatar = ThumbnailImageField(
+        thumbnail_source='avatar_thumbnail', max_length=100,
+        required=False, allow_null=True
+    )
 
     class Meta:
         model = User
@@ -38,6 +52,8 @@ class UserSerializer(djoser.serializers.UserSerializer):
         ]
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -46,7 +62,7 @@ class UserSerializer(djoser.serializers.UserSerializer):
 
 class AvatarSerializer(serializers.ModelSerializer):
 
-    avatar = Base64ImageField(allow_null=True)
+    avatar = StreamingBase64ImageField(allow_null=True)
 
     class Meta:
         model = User
@@ -62,7 +78,7 @@ class UserCreateSerializer(djoser.serializers.UserCreateSerializer):
             'last_name', 'password', 'avatar')
 
     class UserUpdateSerializer(serializers.ModelSerializer):
-        avatar = Base64ImageField(max_length=None, use_url=True)
+        avatar = StreamingBase64ImageField(max_length=None, use_url=True)
 
         class Meta:
             model = User
@@ -107,17 +123,27 @@ class SubscribeListSerializer(serializers.ModelSerializer):
         return data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = int(request.GET.get('recipes_limit', 0))
-        recipes = obj.recipes.all()[:limit] if limit else obj.recipes.all()
+        if hasattr(obj, 'recipes_preview'):
+            recipes = obj.recipes_preview
+        else:
+            request = self.context.get('request')
+            limit = int(request.GET.get('recipes_limit', 0))
+            recipes = (
+                obj.recipes.all()[:limit] if limit else obj.recipes.all()
+            )
         serializer = RecipeShortSerializer(recipes, many=True, read_only=True)
         return serializer.data
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image = ThumbnailImageField(
+        thumbnail_source='image_thumbnail', read_only=True
+    )
 
     class Meta:
         fields = (
@@ -125,6 +151,7 @@ class RecipeShortSerializer(serializers.ModelSerializer):
             'image',
         )
         model = Recipe
+        list_serializer_class = CompiledListSerializer
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -132,12 +159,14 @@ class TagSerializer(serializers.ModelSerializer):
     class Meta:
         fields = ('id', 'name', 'color', 'slug')
         model = Tag
+        list_serializer_class = CompiledListSerializer
 
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         fields = ('id', 'name', 'measurement_unit')
         model = Ingredient
+        list_serializer_class = CompiledListSerializer
 
 
 class IngredientRecipeSerializer(serializers.ModelSerializer):
@@ -155,9 +184,9 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
 
 
 class IngredientRecipeForCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    # Существование ингредиентов проверяется одним запросом
+    # в CreateRecipeSerializer.validate_ingredients.
+    id = serializers.IntegerField()
 
     class Meta:
         model = IngredientToRecipe
@@ -172,7 +201,9 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         source='ingredient_to_recipe')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField(max_length=None)
+    image = Base64ThumbnailImageField(
+        thumbnail_source='image_thumbnail', max_length=None
+    )
 
     class Meta:
         model = Recipe
@@ -180,28 +211,39 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                   'is_favorited', 'is_in_shopping_cart',
                   'name', 'image', 'text', 'cooking_time'
                   )
+        list_serializer_class = CompiledListSerializer
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (request.user.is_authenticated
                 and obj.favorites.filter(user=request.user).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (request.user.is_authenticated
                 and obj.shopping_list.filter(user=request.user).exists())
 
 
+class CookableRecipeSerializer(RecipeReadSerializer):
+    missing_count = serializers.IntegerField(read_only=True)
+    matched_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + (
+            'missing_count', 'matched_count'
+        )
+
+
 class CreateRecipeSerializer(serializers.ModelSerializer):
     ingredients = IngredientRecipeForCreateSerializer(
         many=True,
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all(),
-        error_messages={'does_not_exist': 'Тега не существует'}
-    )
-    image = Base64ImageField(max_length=None)
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = StreamingBase64ImageField(max_length=None)
     author = UserSerializer(read_only=True)
     cooking_time = serializers.IntegerField()
 
@@ -213,13 +255,21 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         recipe_id = self.instance.id if self.instance else None
+        # При частичном PATCH недостающие поля берутся из рецепта.
+        name = data.get('name', getattr(self.instance, 'name', None))
+        text = data.get('text', getattr(self.instance, 'text', None))
+        if not {'name', 'text'} & data.keys() or None in (name, text):
+            return data
 
-        if data["name"].strip().lower() == data["text"].strip().lower():
+        if name.strip().lower() == text.strip().lower():
             raise serializers.ValidationError(
                 'Описание рецепта не должно совпадать с его названием.'
             )
-        if Recipe.objects.filter(
-            text=data["text"]
+        # Неизменённое описание не проверяется: у дубликатов из
+        # миграции 0009 хэш сохранён с солью и совпал бы с оригиналом.
+        text_changed = text != getattr(self.instance, 'text', None)
+        if text_changed and Recipe.objects.filter(
+            text_hash=make_text_hash(text)
         ).exclude(id=recipe_id).exists():
             raise serializers.ValidationError(
                 'Рецепт с таким описанием уже существует.'
@@ -231,6 +281,8 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Теги должны быть уникальны.')
         if not tags:
             raise serializers.ValidationError('Отсутствуют теги')
+        if Tag.objects.filter(id__in=tags).count() != len(tags):
+            raise serializers.ValidationError('Тега не существует')
         return tags
 
     def validate_cooking_time(self, cooking_time):
@@ -255,40 +307,91 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
             if int(ingredient.get('amount', 0)) < 1:
                 raise serializers.ValidationError('Не добавили ингредиенты')
+        if (
+            Ingredient.objects.filter(id__in=ingredients_list).count()
+            != len(ingredients_list)
+        ):
+            raise serializers.ValidationError('Ингредиента не существует')
         return ingredients
 
     @staticmethod
-    def add_tags_and_ingredients_to_recipe(recipe, tags, ingredients):
-        recipe.tags.set(tags)
-        IngredientToRecipe.objects.bulk_create([
+    def set_ingredients(recipe, ingredients):
+        """Приводит состав рецепта к ingredients, меняя только разницу.
+
+        Возвращает прежние количества {ingredient_id: amount} или None,
+        если состав не изменился.
+        """
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        rows = {
+            row.ingredient_id: row
+            for row in IngredientToRecipe.objects.filter(recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in rows.items()
+        }
+        changed = []
+        for ingredient_id, row in rows.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        new = [
             IngredientToRecipe(
-                ingredient=ingredient_data['id'],
-                amount=ingredient_data['amount'],
-                recipe=recipe
-            ) for ingredient_data in ingredients
-        ])
-
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in rows
+        ]
+        removed = rows.keys() - amounts.keys()
+        if changed:
+            IngredientToRecipe.objects.bulk_update(changed, ['amount'])
+        if new:
+            IngredientToRecipe.objects.bulk_create(new)
+        if removed:
+            IngredientToRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        return old_amounts if changed or new or removed else None
+
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context.get('request', None)
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=request.user, **validated_data)
-        self.add_tags_and_ingredients_to_recipe(recipe, tags, ingredients)
+        recipe.tags.set(tags)
+        IngredientToRecipe.objects.bulk_create([
+            IngredientToRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount'],
+            ) for ingredient in ingredients
+        ])
+        ingredients_changed.send(sender=Recipe, recipe_ids=[recipe.pk])
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         if tags is not None:
             recipe.tags.set(tags)
         if ingredients is not None:
-            IngredientToRecipe.objects.filter(recipe=recipe).delete()
-            self.add_tags_and_ingredients_to_recipe(recipe, tags, ingredients)
+            old_amounts = self.set_ingredients(recipe, ingredients)
+            if old_amounts is not None:
+                ShopListIngredient.update_recipe(recipe, old_amounts)
+                ingredients_changed.send(
+                    sender=Recipe, recipe_ids=[recipe.pk]
+                )
         return super().update(recipe, validated_data)
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        # Перечитываем рецепт с prefetch_related, как в карточке,
+        # чтобы не обращаться к БД за каждым ингредиентом.
+        instance = Recipe.objects.for_reading(request.user).get(pk=instance.pk)
         return RecipeReadSerializer(instance, context={
-            'request': self.context.get('request')
+            'request': request
         }).data
 
 
@@ -338,6 +441,19 @@ class ShopListSerializer(serializers.ModelSerializer):
         ).data
 
 
+class RecipeBatchSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных операций с избранным и корзиной."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPE_BATCH_MAX_SIZE,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
 class LinkLiteSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -352,7 +468,10 @@ class LinkLiteSerializer(serializers.ModelSerializer):
         )
 
     def create(self, validated_data):
-        instance, _ = URL.objects.get_or_create(**validated_data)
+        instance, _ = URL.objects.get_or_create(
+            url_digest=make_url_digest(validated_data['original_url']),
+            defaults=validated_data,
+        )
         return instance
 
     def to_representation(self, instance):
@@ -0,0 +1,111 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete
+)
+from django.dispatch import receiver
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientToRecipe,
+    Recipe,
+    ShopList,
+    Tag,
+    TagToRecipe
+)
+from recipes.signals import bulk_changed, in_batch, user_lists_changed
+from users.models import Subscription, User
+from .cache import recipe_cache
+from .conditional import bump_version
+
+VERSIONED_MODELS = (
+    Favorite,
+    Ingredient,
+    IngredientToRecipe,
+    Recipe,
+    ShopList,
+    Subscription,
+    Tag,
+    TagToRecipe,
+    User,
+)
+
+
+def bump_table_version(sender, update_fields=None, **kwargs):
+    if in_batch.get():
+        return
+    if sender is User and update_fields == frozenset({'last_login'}):
+        return
+    bump_version(sender)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_table_version, sender=model)
+    post_delete.connect(bump_table_version, sender=model)
+    bulk_changed.connect(bump_table_version, sender=model)
+user_lists_changed.connect(bump_table_version, sender=Favorite)
+user_lists_changed.connect(bump_table_version, sender=ShopList)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_tags_version(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_version(TagToRecipe)
+
+
+def invalidate_recipe_cache(recipe):
+    recipe_cache.invalidate(
+        'all',
+        f'recipe:{recipe.pk}',
+        f'author:{recipe.author_id}',
+        *(f'tag:{slug}' for slug in recipe.tags.values_list('slug', flat=True))
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(pre_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    invalidate_recipe_cache(instance)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, **kwargs):
+    # pre_-события ловят теги до изменения, post_- — после.
+    if reverse:
+        recipe_cache.invalidate('reference')
+    else:
+        invalidate_recipe_cache(instance)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(bulk_changed, sender=Ingredient)
+@receiver(bulk_changed, sender=Recipe)
+def invalidate_reference(sender, **kwargs):
+    recipe_cache.invalidate('reference')
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, created, update_fields=None,
+                      **kwargs):
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    # Автор виден и в списках по тегам его рецептов.
+    tag_slugs = (
+        TagToRecipe.objects.filter(recipe__author=instance)
+        .values_list('tag__slug', flat=True)
+        .distinct()
+    )
+    recipe_cache.invalidate(
+        'all',
+        f'author:{instance.pk}',
+        *(
+            f'recipe:{pk}'
+            for pk in instance.recipes.values_list('pk', flat=True)
+        ),
+        *(f'tag:{slug}' for slug in tag_slugs)
+    )
@@ -0,0 +1,463 @@
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.cache import recipe_cache
+from api.filter import POPULAR_ORDERING
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientToRecipe,
+    Recipe,
+    ShopList,
+    ShopListIngredient,
+    Tag,
+    TagToRecipe
+)
+from recipes.search import update_search_vector
+from users.models import Subscription, User
+
+RECIPES_URL = '/api/recipes/'
+TAGS_URL = '/api/tags/'
+INGREDIENTS_URL = '/api/ingredients/'
+FEED_URL = '/api/recipes/feed/'
+MISSING_RECIPE_ID = 10 ** 6
+# Теги, ингредиенты и авторы подгружаются prefetch-запросами, поэтому
+# число запросов не зависит от размера страницы.
+ANONYMOUS_QUERIES = 5
+AUTHENTICATED_QUERIES = 5
+
+
+class RecipeListQueriesTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Читатель', last_name='Читатель',
+            password='reader-password',
+        )
+        authors = [
+            User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com',
+                first_name='Автор', last_name='Автор',
+                password='author-password',
+            )
+            for i in range(5)
+        ]
+        Subscription.objects.create(
+            subscriber=cls.user, author=authors[0]
+        )
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', slug=f'tag{i}', color=f'#00000{i}'
+            )
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г'
+            )
+            for i in range(10)
+        ]
+        recipes = [
+            Recipe.objects.create(
+                author=authors[i % len(authors)],
+                name=f'Рецепт {i}',
+                text=f'Описание рецепта {i}',
+                description=f'Описание рецепта {i}',
+                cooking_time=10,
+                image='recipes/image/test.png',
+            )
+            for i in range(110)
+        ]
+        TagToRecipe.objects.bulk_create(
+            TagToRecipe(tag=tags[i % len(tags)], recipe=recipe)
+            for i, recipe in enumerate(recipes)
+        )
+        IngredientToRecipe.objects.bulk_create(
+            IngredientToRecipe(
+                ingredient=ingredients[(i + j) % len(ingredients)],
+                recipe=recipe,
+                amount=j + 1,
+            )
+            for i, recipe in enumerate(recipes)
+            for j in range(3)
+        )
+
+    def assert_list_queries(self, limit, queries):
+        # Ответы анонимам и версии таблиц кэшируются между запросами.
+        cache.clear()
+        recipe_cache.invalidate('reference')
+        with self.assertNumQueries(queries):
+            response = self.client.get(RECIPES_URL, {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), limit)
+
+    def test_anonymous_queries_do_not_depend_on_page_size(self):
+        for limit in (6, 100):
+            with self.subTest(limit=limit):
+                self.assert_list_queries(limit, ANONYMOUS_QUERIES)
+
+    def test_authenticated_queries_do_not_depend_on_page_size(self):
+        self.client.force_authenticate(self.user)
+        for limit in (6, 100):
+            with self.subTest(limit=limit):
+                self.assert_list_queries(limit, AUTHENTICATED_QUERIES)
+
+
+def shared_cache(location):
+    return override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': location,
+    }})
+
+
+class ReferenceListTest(APITestCase):
+
+    def assert_new_ingredient_listed(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Соль', measurement_unit='г')
+        self.assertEqual(len(self.client.get(INGREDIENTS_URL).json()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Сахар', measurement_unit='г')
+        names = [
+            item['name'] for item in self.client.get(INGREDIENTS_URL).json()
+        ]
+        self.assertEqual(sorted(names), ['Сахар', 'Соль'])
+
+    def test_new_ingredient_listed_with_process_cache(self):
+        self.assert_new_ingredient_listed()
+
+    def test_new_ingredient_listed_with_shared_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            with shared_cache(location):
+                self.assert_new_ingredient_listed()
+
+
+class ConditionalResponseTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Завтрак', slug='breakfast', color='#ff0000')
+        Tag.objects.create(name='Обед', slug='lunch', color='#00ff00')
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Читатель', last_name='Читатель',
+            password='reader-password',
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = shared_cache(directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get(self, url, etag=None):
+        headers = {} if etag is None else {'HTTP_IF_NONE_MATCH': etag}
+        return self.client.get(url, **headers)
+
+    def test_same_request_gets_not_modified(self):
+        etag = self.get(TAGS_URL)['ETag']
+        self.assertEqual(self.get(TAGS_URL, etag).status_code, 304)
+
+    def test_query_string_changes_etag(self):
+        etag = self.get(TAGS_URL)['ETag']
+        response = self.get(f'{TAGS_URL}?name=З', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_user_changes_etag(self):
+        etag = self.get(TAGS_URL)['ETag']
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.get(TAGS_URL, etag).status_code, 200)
+
+    def test_change_invalidates_etag(self):
+        etag = self.get(TAGS_URL)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Ужин', slug='dinner', color='#0000ff')
+        self.assertEqual(self.get(TAGS_URL, etag).status_code, 200)
+
+    def test_no_etag_without_shared_cache(self):
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}):
+            self.assertNotIn('ETag', self.get(TAGS_URL))
+
+
+def walk_cursor(test, url, link):
+    """id рецептов со всех страниц по ссылкам next или previous."""
+    ids = []
+    while url:
+        response = test.client.get(url)
+        test.assertEqual(response.status_code, 200)
+        data = response.json()
+        test.assertNotIn('count', data)
+        page = [recipe['id'] for recipe in data['results']]
+        ids.extend(page if link == 'next' else reversed(page))
+        url = data[link]
+    return ids
+
+
+def assert_cursor_round_trip(test, url, expected):
+    test.assertEqual(walk_cursor(test, url, 'next'), expected)
+    last = test.client.get(url).json()
+    while last['next']:
+        last = test.client.get(last['next']).json()
+    backward = walk_cursor(test, last['previous'], 'previous')
+    tail = [recipe['id'] for recipe in last['results']]
+    test.assertEqual(list(reversed(backward)) + tail, expected)
+
+
+class FeedCursorTest(APITestCase):
+    """Лента по курсору не теряет и не повторяет рецепты."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Читатель', last_name='Читатель',
+            password='reader-password',
+        )
+        authors = [
+            User.objects.create_user(
+                username=f'author{i}', email=f'author{i}@example.com',
+                first_name='Автор', last_name='Автор',
+                password='author-password',
+            )
+            for i in range(4)
+        ]
+        for author in authors[:3]:
+            Subscription.objects.create(subscriber=cls.user, author=author)
+        now = timezone.now()
+        for i in range(20):
+            recipe = Recipe.objects.create(
+                author=authors[i % len(authors)],
+                name=f'Рецепт {i}',
+                text=f'Описание рецепта {i}',
+                description=f'Описание рецепта {i}',
+                cooking_time=10,
+                image='recipes/image/test.png',
+            )
+            # По пять рецептов с одинаковой датой публикации.
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timedelta(hours=i // 5)
+            )
+        cls.expected = list(
+            Recipe.objects.filter(author__in=authors[:3])
+            .order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def assert_feed_stable(self):
+        self.client.force_authenticate(self.user)
+        assert_cursor_round_trip(self, f'{FEED_URL}?limit=4', self.expected)
+
+    def test_single_query_feed(self):
+        self.assert_feed_stable()
+
+    @override_settings(FEED_MERGE_THRESHOLD=0)
+    def test_merged_feed(self):
+        with patch('api.views.FEED_GROUP_SIZE', 2):
+            self.assert_feed_stable()
+
+
+class RecipeBatchTest(APITestCase):
+    """Пакетные операции обновляют счётчики и список покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Автор', last_name='Автор',
+            password='author-password',
+        )
+        cls.user, cls.other = [
+            User.objects.create_user(
+                username=f'reader{i}', email=f'reader{i}@example.com',
+                first_name='Читатель', last_name='Читатель',
+                password='reader-password',
+            )
+            for i in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г'
+            )
+            for i in range(5)
+        ]
+        cls.recipes = []
+        for i in range(4):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {i}',
+                text=f'Описание рецепта {i}',
+                description=f'Описание рецепта {i}',
+                cooking_time=10,
+                image='recipes/image/test.png',
+            )
+            IngredientToRecipe.objects.bulk_create(
+                IngredientToRecipe(
+                    recipe=recipe, ingredient=ingredients[i + j],
+                    amount=10 * (j + 1),
+                )
+                for j in range(2)
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        first, second = self.recipes[:2]
+        for model in (Favorite, ShopList):
+            model.objects.create(user=self.user, recipe=first)
+            model.objects.create(user=self.other, recipe=second)
+        self.client.force_authenticate(self.user)
+
+    def send(self, method, url, ids):
+        response = getattr(self.client, method)(
+            url, {'recipes': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return {
+            item['id']: item['status'] for item in response.json()['results']
+        }
+
+    def assert_counts(self, field, expected):
+        self.assertEqual(
+            list(
+                Recipe.objects.filter(pk__in=[r.pk for r in self.recipes])
+                .order_by('pk').values_list(field, flat=True)
+            ),
+            expected,
+        )
+
+    def assert_totals(self):
+        self.assertEqual(
+            set(ShopListIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            )),
+            set(ShopListIngredient.calculate_totals()),
+        )
+
+    def check_batch(self, url, model, field):
+        first, second, third, fourth = (r.pk for r in self.recipes)
+        statuses = self.send(
+            'post', url, [second, MISSING_RECIPE_ID, first, third, second]
+        )
+        self.assertEqual(statuses, {
+            second: 'added',
+            MISSING_RECIPE_ID: 'not_found',
+            first: 'exists',
+            third: 'added',
+        })
+        self.assertEqual(
+            set(model.objects.filter(user=self.user)
+                .values_list('recipe_id', flat=True)),
+            {first, second, third},
+        )
+        self.assert_counts(field, [1, 2, 1, 0])
+        self.assert_totals()
+
+        statuses = self.send(
+            'delete', url, [first, fourth, MISSING_RECIPE_ID, second]
+        )
+        self.assertEqual(statuses, {
+            first: 'removed',
+            fourth: 'missing',
+            MISSING_RECIPE_ID: 'not_found',
+            second: 'removed',
+        })
+        self.assertEqual(
+            list(model.objects.filter(user=self.user)
+                 .values_list('recipe_id', flat=True)),
+            [third],
+        )
+        self.assert_counts(field, [0, 1, 1, 0])
+        self.assert_totals()
+
+    def test_shopping_cart_batch(self):
+        self.check_batch(
+            f'{RECIPES_URL}shopping_cart/', ShopList, 'in_carts_count'
+        )
+        self.assertEqual(
+            set(ShopListIngredient.objects.filter(user=self.user)
+                .values_list('ingredient__name', 'total_amount')),
+            {('Ингредиент 2', 10), ('Ингредиент 3', 20)},
+        )
+
+    def test_favorite_batch(self):
+        self.check_batch(
+            f'{RECIPES_URL}favorite/', Favorite, 'favorites_count'
+        )
+        # Избранное не трогает список покупок.
+        self.assertEqual(
+            ShopList.objects.filter(user=self.user).count(), 1
+        )
+
+
+class RecipePaginationTest(APITestCase):
+    """Поиск листается по номерам страниц, остальное — и по курсору."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Автор', last_name='Автор',
+            password='author-password',
+        )
+        names = [
+            'Борщ', 'Щи', 'Окрошка', 'Солянка', 'Уха', 'Рассольник', 'Суп',
+        ]
+        now = timezone.now()
+        for i, name in enumerate(names):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=name,
+                # Название совпадает с запросом лучше, чем описание.
+                text='Почти борщ' if name == 'Рассольник' else name,
+                description=name,
+                cooking_time=10,
+                image='recipes/image/test.png',
+            )
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timedelta(hours=(len(names) - i) // 2),
+                favorites_count=i % 3,
+            )
+        update_search_vector(Recipe.objects.all())
+
+    def recipe_ids(self, ordering):
+        return list(
+            Recipe.objects.order_by(*ordering).values_list('id', flat=True)
+        )
+
+    def test_search_is_ranked(self):
+        for params in ('', '&cursor=', '&limit=1&cursor='):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    f'{RECIPES_URL}?search=борщ{params}'
+                )
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                self.assertEqual(data['count'], 2)
+                names = [recipe['name'] for recipe in data['results']]
+                self.assertEqual(names, ['Борщ', 'Рассольник'][:len(names)])
+                if data['next']:
+                    self.assertIn('page=2', data['next'])
+
+    def test_cursor_round_trip(self):
+        for ordering, query in (
+            (('-pub_date', '-id'), ''),
+            (POPULAR_ORDERING, '&ordering=popular'),
+        ):
+            with self.subTest(query=query):
+                assert_cursor_round_trip(
+                    self,
+                    f'{RECIPES_URL}?limit=2&cursor={query}',
+                    self.recipe_ids(ordering),
+                )
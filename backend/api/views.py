@@ -1,36 +1,58 @@
 from io import BytesIO
 
-from django.http import FileResponse, HttpResponse
+from django.conf import settings
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (
+    IsAdminUser,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly
 )
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 
+from recipes.autocomplete import ingredient_index
+from recipes.cookable import cookable_index
 from recipes.make_pdf import make_pdf_file
+from recipes.shopping_list import EXPORT_FORMATS, ROWS_PER_CHUNK
 from recipes.models import (
     Favorite,
     Ingredient,
+    IngredientToRecipe,
     Recipe,
     ShopList,
-    Tag
+    Tag,
+    TagToRecipe
 )
 from users.models import Subscription, User
-from .filter import RecipeFilter, IngredientFilter
-from .mixin import AddRemoveMixin
-from .pagination import CustomPagination
+from .cache import recipe_cache
+from .conditional import conditional
+from .filter import POPULAR_ORDERING, RecipeFilter, IngredientFilter
+from .mixin import AddRemoveMixin, AnonymousCacheMixin, ReferenceJSONMixin
+from .pagination import CustomPagination, KeysetPagination
 from .permissions import AuthorPermission
+from .renderers import (
+    CSVRenderer,
+    ORJSONRenderer,
+    PDFRenderer,
+    PlainTextRenderer
+)
 from .serializers import (
     AvatarSerializer,
+    CookableRecipeSerializer,
     CreateRecipeSerializer,
     FavoriteSerializer,
     IngredientSerializer,
+    RecipeBatchSerializer,
     RecipeReadSerializer,
     ShopListSerializer,
     SubscribeListSerializer,
@@ -44,6 +66,7 @@ class UserViewSet(UserViewSet):
     queryset = User.objects.all().order_by('id')
     serializer_class = UserSerializer
     pagination_class = CustomPagination
+    cursor_ordering = ('id',)
 
     @action(
         methods=['GET'],
@@ -84,7 +107,24 @@ class UserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(subscribers__subscriber=user)
+        limit = int(request.GET.get('recipes_limit', 0))
+        recipes = Recipe.objects.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=F('pub_date').desc(),
+            )
+        )
+        if limit:
+            recipes = recipes.filter(row_number__lte=limit)
+        queryset = (
+            User.objects.filter(subscribers__subscriber=user)
+            .prefetch_related(
+                Prefetch('recipes', queryset=recipes,
+                         to_attr='recipes_preview')
+            )
+            .order_by('id')
+        )
         pages = self.paginate_queryset(queryset)
         serializer = SubscribeListSerializer(
             pages, many=True, context={'request': request}
@@ -115,7 +155,26 @@ class UserViewSet(UserViewSet):
         return serializer
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+FEED_GROUP_SIZE = 100
+
+RECIPE_DETAIL_MODELS = (
+    Recipe,
+    IngredientToRecipe,
+    TagToRecipe,
+    Ingredient,
+    Tag,
+    User,
+    Subscription,
+    Favorite,
+    ShopList,
+)
+
+
+@method_decorator(conditional(Ingredient), name='retrieve')
+@method_decorator(conditional(Ingredient), name='list')
+class IngredientViewSet(
+    ReferenceJSONMixin, viewsets.ReadOnlyModelViewSet
+):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
@@ -123,58 +182,132 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def get_limit(self):
+        limit = self.request.query_params.get('limit', '')
+        return int(limit) if limit.isdigit() else None
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        limit = self.get_limit()
+        if name and settings.INGREDIENT_INDEX_ENABLED:
+            return Response(ingredient_index.search(name, limit))
+        if not name and limit is None:
+            response = self.encoded_list()
+            if response is not None:
+                return response
+        queryset = self.filter_queryset(self.get_queryset())[:limit]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
 
-class TagViewSet(viewsets.ModelViewSet):
+@method_decorator(conditional(Tag), name='retrieve')
+@method_decorator(conditional(Tag), name='list')
+class TagViewSet(ReferenceJSONMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        response = self.encoded_list()
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return response
+
 
-class RecipeViewSet(viewsets.ModelViewSet, AddRemoveMixin):
+@method_decorator(
+    conditional(*RECIPE_DETAIL_MODELS, per_user=True), name='retrieve'
+)
+class RecipeViewSet(
+    viewsets.ModelViewSet, AddRemoveMixin, AnonymousCacheMixin
+):
     queryset = Recipe.objects.all()
     serializer_class = CreateRecipeSerializer
     permission_classes = (AuthorPermission,)
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
+    response_cache = recipe_cache
+    cache_query_params = (
+        'tags', 'author', 'page', 'limit', 'search', 'cursor'
+    )
+    ignored_query_params = ('is_favorited', 'is_in_shopping_cart')
+
+    @property
+    def cursor_ordering(self):
+        if self.request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        return ('-pub_date', '-id')
+
+    def get_cache_groups(self, params):
+        groups = ['reference']
+        if self.action == 'retrieve':
+            return groups + [f'recipe:{self.kwargs["pk"]}']
+        authors = params.get('author', [])
+        tags = params.get('tags', [])
+        groups += [f'author:{author}' for author in authors]
+        groups += [f'tag:{tag}' for tag in tags]
+        if not authors and not tags:
+            groups.append('all')
+        return groups
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve', 'feed']:
+            queryset = queryset.for_reading(self.request.user)
+        return queryset
 
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'feed']:
             return RecipeReadSerializer
         elif self.action == 'get_link':
             return LinkLiteSerializer
+        elif self.action == 'cookable':
+            return CookableRecipeSerializer
         elif self.action == 'favorite':
             return FavoriteSerializer
         elif self.action == 'shopping_cart':
             return ShopListSerializer
+        elif self.action in ['shopping_cart_batch', 'favorite_batch']:
+            return RecipeBatchSerializer
         return CreateRecipeSerializer
 
-    @staticmethod
-    def generate_shopping_list(ingredients):
-        items = [
-            "{name} ({unit}) - {amount}".format(
-                name=ing['ingredient__name'],
-                unit=ing['ingredient__measurement_unit'],
-                amount=ing['total_amount']
-            ) for ing in ingredients
-        ]
-        shopping_list = "Купить в магазине:\n" + "\n".join(items)
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
-        )
-        return response
-
-    @action(detail=False, methods=['get'])
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            PDFRenderer, PlainTextRenderer, CSVRenderer, ORJSONRenderer
+        ),
+    )
     def download_shopping_cart(self, request):
         ingredients = ShopList.get_shopping_ingredients(request.user)
-        pdf_file = make_pdf_file(ingredients, [], request)
-        return FileResponse(
-            BytesIO(pdf_file),
-            as_attachment=True,
-            filename='shopping_list.pdf'
+        export_format = request.accepted_renderer.format
+        if export_format == 'pdf':
+            pdf_file = make_pdf_file(ingredients, [], request)
+            return FileResponse(
+                BytesIO(pdf_file),
+                as_attachment=True,
+                filename='shopping_list.pdf'
+            )
+
+        content_type, iter_content = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(
+            iter_content(ingredients.iterator(chunk_size=ROWS_PER_CHUNK)),
+            content_type=f'{content_type}; charset=utf-8',
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{export_format}"'
         )
+        return response
 
     @action(
         detail=True,
@@ -212,6 +345,48 @@ class RecipeViewSet(viewsets.ModelViewSet, AddRemoveMixin):
         self.model_field = 'recipe'
         return self.remove_from_list(request, pk)
 
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-batch',
+        permission_classes=(IsAuthenticated,))
+    def shopping_cart_batch(self, request):
+        self.serializer_class = RecipeBatchSerializer
+        self.model = Recipe
+        self.related_model = ShopList
+        self.model_field = 'recipe'
+        return self.add_many_to_list(request)
+
+    @shopping_cart_batch.mapping.delete
+    def destroy_shopping_cart_batch(self, request):
+        self.serializer_class = RecipeBatchSerializer
+        self.model = Recipe
+        self.related_model = ShopList
+        self.model_field = 'recipe'
+        return self.remove_many_from_list(request)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='favorite',
+        url_name='favorite-batch',
+        permission_classes=(IsAuthenticated,))
+    def favorite_batch(self, request):
+        self.serializer_class = RecipeBatchSerializer
+        self.model = Recipe
+        self.related_model = Favorite
+        self.model_field = 'recipe'
+        return self.add_many_to_list(request)
+
+    @favorite_batch.mapping.delete
+    def destroy_favorite_batch(self, request):
+        self.serializer_class = RecipeBatchSerializer
+        self.model = Recipe
+        self.related_model = Favorite
+        self.model_field = 'recipe'
+        return self.remove_many_from_list(request)
+
     @action(
         methods=['get'],
         detail=True,
@@ -223,7 +398,7 @@ class RecipeViewSet(viewsets.ModelViewSet, AddRemoveMixin):
 
         original_url = request.META.get('HTTP_REFERER')
         if original_url is None:
-            url = reverse('api:recipe-detail', kwargs={'pk': pk})
+            url = reverse('users:recipes-detail', kwargs={'pk': pk})
             original_url = request.build_absolute_uri(url)
 
         serializer = self.get_serializer(
@@ -234,3 +409,85 @@ class RecipeViewSet(viewsets.ModelViewSet, AddRemoveMixin):
         serializer.save()
 
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,),
+    )
+    def feed(self, request):
+        paginator = KeysetPagination(self.paginator.get_page_size(request))
+        follows = Subscription.objects.filter(subscriber=request.user)
+        if follows.count() <= settings.FEED_MERGE_THRESHOLD:
+            page = paginator.paginate_queryset(
+                self.get_queryset().filter(
+                    author__subscribers__subscriber=request.user
+                ),
+                request,
+                self,
+            )
+        else:
+            # На тысячах авторов один запрос с IN перебирает все их
+            # рецепты. paginate_streams фильтрует каждую группу по
+            # курсору и берёт из неё не больше page_size + 1 строк,
+            # так что по индексу (author, -pub_date, -id) читается
+            # не больше страницы на автора группы.
+            author_ids = list(follows.values_list('author_id', flat=True))
+            streams = paginator.paginate_streams(
+                [
+                    Recipe.objects.filter(
+                        author_id__in=author_ids[start:start + FEED_GROUP_SIZE]
+                    )
+                    for start in range(0, len(author_ids), FEED_GROUP_SIZE)
+                ],
+                request,
+                self,
+            )
+            recipes = self.get_queryset().in_bulk(
+                [recipe.pk for recipe in streams]
+            )
+            page = [recipes[recipe.pk] for recipe in streams
+                    if recipe.pk in recipes]
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def get_ingredient_ids(request):
+        try:
+            ingredient_ids = {
+                int(value)
+                for values in request.query_params.getlist('ingredients')
+                for value in values.split(',') if value
+            }
+        except ValueError:
+            ingredient_ids = None
+        if not ingredient_ids:
+            raise ValidationError(
+                {'ingredients': 'Передайте id ингредиентов через запятую.'}
+            )
+        return ingredient_ids
+
+    @action(detail=False, methods=['get'])
+    def cookable(self, request):
+        ranked = cookable_index.search(self.get_ingredient_ids(request))
+        page = self.paginate_queryset(ranked)
+        recipes = Recipe.objects.for_reading(request.user).in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        result = []
+        for recipe_id, missing_count, matched_count in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.missing_count = missing_count
+            recipe.matched_count = matched_count
+            result.append(recipe)
+        serializer = self.get_serializer(result, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class CacheStatsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response({'recipes': recipe_cache.stats()})
@@ -102,6 +102,17 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SIMPLE_JWT = {
@@ -133,6 +144,64 @@ MEDIA_ROOT = '/media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+INGREDIENT_INDEX_ENABLED = (
+    os.getenv('INGREDIENT_INDEX_ENABLED', 'True') == 'True'
+)
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+
+LINKLITE_CACHE_SIZE = int(os.getenv('LINKLITE_CACHE_SIZE', 10000))
+LINKLITE_CODE_BLOCK_SIZE = int(os.getenv('LINKLITE_CODE_BLOCK_SIZE', 100))
+LINKLITE_CLICK_FLUSH_INTERVAL = int(
+    os.getenv('LINKLITE_CLICK_FLUSH_INTERVAL', 10)
+)
+
+# Для таблиц больше этого числа строк страницы без фильтров считаются по
+# статистике PostgreSQL вместо COUNT(*); 0 — всегда точный подсчёт.
+APPROXIMATE_COUNT_THRESHOLD = int(
+    os.getenv('APPROXIMATE_COUNT_THRESHOLD', 100000)
+)
+
+# С какого числа подписок лента собирается слиянием потоков по авторам.
+FEED_MERGE_THRESHOLD = int(os.getenv('FEED_MERGE_THRESHOLD', 500))
+
+# Списки рецептов, тегов и ингредиентов сериализуются заранее
+# собранным планом полей (api.compiled) вместо обхода полей DRF.
+COMPILED_SERIALIZERS = os.getenv('COMPILED_SERIALIZERS', 'False') == 'True'
+
+# Загруженные изображения перекодируются и получают миниатюры в пуле
+# из IMAGE_WORKERS потоков; 0 — обработка сразу после сохранения.
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'WEBP')
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 85))
+# Ограничения для изображений в Base64: размер файла и число пикселей.
+IMAGE_MAX_UPLOAD_SIZE = int(
+    os.getenv('IMAGE_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+)
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 25_000_000))
+
+RESPONSE_CACHE = {
+    'BACKEND': 'api.cache.LocMemLRUBackend',
+    'OPTIONS': {
+        'max_entries': int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000)),
+        'timeout': int(os.getenv('RESPONSE_CACHE_TIMEOUT', 60)),
+    },
+}
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+    RESPONSE_CACHE = {
+        'BACKEND': 'api.cache.DjangoCacheBackend',
+        'OPTIONS': {
+            'alias': 'default',
+            'timeout': int(os.getenv('RESPONSE_CACHE_TIMEOUT', 60)),
+        },
+    }
+
 DJOSER = {
     'HIDE_USERS': False,
     'LOGIN_FIELD': 'email',
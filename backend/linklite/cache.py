@@ -0,0 +1,87 @@
+import atexit
+import threading
+from collections import Counter, OrderedDict
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, models
+
+from .models import URL
+
+FLUSH_BATCH_SIZE = 500
+
+
+class LinkCache:
+    """Ограниченный LRU-кэш url_hash -> original_url."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url_hash):
+        with self._lock:
+            original_url = self._data.get(url_hash)
+            if original_url is not None:
+                self._data.move_to_end(url_hash)
+            return original_url
+
+    def set(self, url_hash, original_url):
+        with self._lock:
+            self._data[url_hash] = original_url
+            self._data.move_to_end(url_hash)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, url_hash):
+        with self._lock:
+            self._data.pop(url_hash, None)
+
+
+class ClickCounter:
+    """Копит переходы в памяти и записывает их в БД пачками.
+
+    Таймер запускается первым переходом после записи, так что без
+    трафика фоновых потоков нет. Остаток записывается при выходе.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def add(self, url_hash):
+        with self._lock:
+            self._counts[url_hash] += 1
+            if self._timer is None:
+                self._timer = threading.Timer(self.interval, self._run)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _run(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._timer = None
+        items = iter(counts.items())
+        while batch := dict(islice(items, FLUSH_BATCH_SIZE)):
+            URL.objects.filter(url_hash__in=batch).update(
+                click_count=models.F('click_count') + models.Case(
+                    *[
+                        models.When(url_hash=url_hash, then=models.Value(n))
+                        for url_hash, n in batch.items()
+                    ],
+                    default=models.Value(0),
+                )
+            )
+
+
+url_cache = LinkCache(settings.LINKLITE_CACHE_SIZE)
+click_counter = ClickCounter(settings.LINKLITE_CLICK_FLUSH_INTERVAL)
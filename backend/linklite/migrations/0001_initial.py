@@ -0,0 +1,30 @@
+# Generated by Django 4.2.15 on 2026-10-18 02:29
+
+from django.db import migrations, models
+import linklite.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='URL',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_hash', models.CharField(default=linklite.models.generate_hash, max_length=15, unique=True)),
+                ('original_url', models.URLField(max_length=2048)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('click_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Ссылка',
+                'verbose_name_plural': 'Ссылки',
+            },
+        ),
+    ]
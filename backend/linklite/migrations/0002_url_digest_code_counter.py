@@ -0,0 +1,52 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_url_digest(apps, schema_editor):
+    URL = apps.get_model('linklite', 'URL')
+    urls = list(URL.objects.only('id', 'original_url').order_by('id'))
+    seen = set()
+    for url in urls:
+        digest = hashlib.sha256(url.original_url.encode()).hexdigest()
+        if digest in seen:
+            # Дубликаты, созданные гонкой get_or_create, сохраняют свои
+            # короткие ссылки, но по адресу находится только первая.
+            digest = hashlib.sha256(
+                f'{url.original_url}#{url.pk}'.encode()
+            ).hexdigest()
+        seen.add(digest)
+        url.url_digest = digest
+    URL.objects.bulk_update(urls, ['url_digest'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('linklite', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='URLCodeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Счётчик коротких ссылок',
+                'verbose_name_plural': 'Счётчики коротких ссылок',
+            },
+        ),
+        migrations.AddField(
+            model_name='url',
+            name='url_digest',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(fill_url_digest, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='url',
+            name='url_digest',
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+    ]
@@ -1,19 +1,88 @@
+import hashlib
 import string
-from random import choice, randint
+import threading
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 
-MIN_HASH_GEN = 8
-MAX_HASH_GEN = 10
 MAX_HASH_LENGTH = 15
 URL_MAX_LENGTH = 2048
+BASE62 = string.digits + string.ascii_letters
+# Коды из счётчика имеют ровно 7 символов (62 ** 7 > 2 ** 40) и не
+# пересекаются со старыми случайными кодами длиной 8-10 символов.
+CODE_LENGTH = 7
+CODE_BITS = 40
+CODE_MASK = (1 << CODE_BITS) - 1
+CODE_MULTIPLIER = 0x9E3779B97
+CODE_XOR = 0x5DEECE66D
+
+
+def encode_base62(number, length=CODE_LENGTH):
+    chars = []
+    while number:
+        number, remainder = divmod(number, len(BASE62))
+        chars.append(BASE62[remainder])
+    return ''.join(reversed(chars)).rjust(length, BASE62[0])
+
+
+def obfuscate(number):
+    """Биекция на [0, 2 ** 40): соседние номера дают непохожие коды."""
+    return ((number * CODE_MULTIPLIER) & CODE_MASK) ^ CODE_XOR
+
+
+class CodeAllocator:
+    """Выдаёт номера коротких ссылок из блоков, зарезервированных в БД.
+
+    Один запрос к счётчику резервирует LINKLITE_CODE_BLOCK_SIZE
+    номеров, дальше коды выдаются из памяти без проверок в БД.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def reserve_block(self):
+        block_size = settings.LINKLITE_CODE_BLOCK_SIZE
+        with transaction.atomic():
+            counter, _ = (
+                URLCodeCounter.objects.select_for_update()
+                .get_or_create(pk=1)
+            )
+            start = counter.next_value
+            counter.next_value = start + block_size
+            counter.save(update_fields=['next_value'])
+        return start, start + block_size
+
+    def allocate(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self.reserve_block()
+            number = self._next
+            self._next += 1
+        return number
+
+
+code_allocator = CodeAllocator()
 
 
 def generate_hash() -> str:
-    return ''.join(
-        choice(string.ascii_letters + string.digits)
-        for _ in range(randint(MIN_HASH_GEN, MAX_HASH_GEN))
-    )
+    return encode_base62(obfuscate(code_allocator.allocate()))
+
+
+def make_url_digest(original_url) -> str:
+    return hashlib.sha256(original_url.encode()).hexdigest()
+
+
+class URLCodeCounter(models.Model):
+    next_value = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Счётчик коротких ссылок'
+        verbose_name_plural = 'Счётчики коротких ссылок'
+
+    def __str__(self):
+        return str(self.next_value)
 
 
 class URL(models.Model):
@@ -21,6 +90,7 @@ class URL(models.Model):
         max_length=MAX_HASH_LENGTH, default=generate_hash, unique=True
     )
     original_url = models.URLField(max_length=URL_MAX_LENGTH)
+    url_digest = models.CharField(max_length=64, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     click_count = models.IntegerField(default=0)
@@ -33,9 +103,5 @@ class URL(models.Model):
         return f'{self.original_url} -> {self.url_hash}'
 
     def save(self, *args, **kwargs):
-        while (
-            not self.pk
-            and URL.objects.filter(url_hash=self.url_hash).exists()
-        ):
-            self.url_hash = generate_hash()
+        self.url_digest = make_url_digest(self.original_url)
         super().save(*args, **kwargs)
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import url_cache
+from .models import URL
+
+
+@receiver(post_save, sender=URL)
+def warm_url_cache(sender, instance, **kwargs):
+    url_cache.set(instance.url_hash, instance.original_url)
+
+
+@receiver(post_delete, sender=URL)
+def evict_url_cache(sender, instance, **kwargs):
+    url_cache.delete(instance.url_hash)
@@ -1,13 +1,17 @@
 from django.views.decorators.http import require_GET
 from django.shortcuts import get_object_or_404, redirect
 
+from .cache import click_counter, url_cache
 from .models import URL
 
 
 @require_GET
 def take_url(request, url_hash):
-    url_instance = get_object_or_404(URL, url_hash=url_hash)
-
-    original_url = url_instance.original_url
+    original_url = url_cache.get(url_hash)
+    if original_url is None:
+        url_instance = get_object_or_404(URL, url_hash=url_hash)
+        original_url = url_instance.original_url
+        url_cache.set(url_hash, original_url)
 
+    click_counter.add(url_hash)
     return redirect(original_url)
@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, IngredientToRecipe, Recipe,
-                     ShopList, Tag)
+                     ShopList, ShopListIngredient, Tag)
+from .signals import ingredients_changed
 
 
 class IngredientInline(admin.TabularInline):
@@ -19,8 +20,22 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (IngredientInline,)
     empty_value_display = '-'
 
+    def save_related(self, request, form, formsets, change):
+        recipe = form.instance
+        # Как и в API, изменения состава переносятся в корзины с рецептом.
+        old_amounts = (
+            ShopListIngredient.get_recipe_amounts(recipe) if change else None
+        )
+        super().save_related(request, form, formsets, change)
+        if old_amounts is not None:
+            ShopListIngredient.update_recipe(recipe, old_amounts)
+        ingredients_changed.send(
+            sender=Recipe, recipe_ids=[form.instance.pk]
+        )
+
+    @admin.display(description='В избранном', ordering='favorites_count')
     def in_favorite(self, obj: Recipe):
-        return obj.favorites.count()
+        return obj.favorites_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -0,0 +1,66 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+
+from .models import Ingredient
+
+PREFIX_END = chr(0x10FFFF)
+
+
+class IngredientIndex:
+    """Поиск ингредиентов по началу и по вхождению названия в памяти.
+
+    Названия хранятся отсортированными в нижнем регистре, совпадения
+    по началу ищутся бинарным поиском, по вхождению — перебором после
+    них. Индекс строится при первом запросе, сбрасывается сигналами
+    при изменении ингредиентов и перестраивается не реже, чем раз в
+    INGREDIENT_INDEX_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None
+        self._rows = None
+        self._built_at = 0
+
+    def invalidate(self):
+        self._keys = None
+
+    def _build(self):
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].casefold(), row['id']),
+        )
+        keys = [row['name'].casefold() for row in rows]
+        return keys, rows
+
+    def _get(self):
+        keys, rows = self._keys, self._rows
+        if (
+            keys is None
+            or time.monotonic() - self._built_at
+            > settings.INGREDIENT_INDEX_TTL
+        ):
+            with self._lock:
+                keys, rows = self._build()
+                self._keys, self._rows = keys, rows
+                self._built_at = time.monotonic()
+        return keys, rows
+
+    def search(self, query, limit=None):
+        query = query.casefold()
+        keys, rows = self._get()
+        start = bisect_left(keys, query)
+        end = bisect_right(keys, query + PREFIX_END, lo=start)
+        result = rows[start:end]
+        if limit is None or len(result) < limit:
+            result += [
+                row for key, row in zip(keys, rows)
+                if query in key and not key.startswith(query)
+            ]
+        return result[:limit]
+
+
+ingredient_index = IngredientIndex()
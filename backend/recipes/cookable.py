@@ -0,0 +1,152 @@
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import IngredientToRecipe
+
+LOG_COUNTER_KEY = 'cookable_index:changes'
+LOG_KEY = 'cookable_index:change:{}'
+LOG_TIMEOUT = 60 * 60
+# Если изменений накопилось больше, индекс проще построить заново.
+MAX_INCREMENTAL_CHANGES = 1000
+BUILD_CHUNK_SIZE = 10000
+
+
+class CookableIndex:
+    """Обратный индекс «ингредиент -> рецепты» для подбора рецептов.
+
+    Для каждого ингредиента хранится отсортированный array('I') с id
+    рецептов, для каждого рецепта — кортеж его ингредиентов. Изменённые
+    рецепты записываются в журнал в кэше: каждый процесс перед поиском
+    дочитывает журнал и обновляет только эти рецепты. Если журнал
+    потерян или слишком длинный, индекс строится заново.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._recipes = None
+        self._seen = None
+
+    @staticmethod
+    def mark_changed(recipe_ids):
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+
+        def write_log():
+            cache.add(LOG_COUNTER_KEY, 0, None)
+            end = cache.incr(LOG_COUNTER_KEY, len(recipe_ids))
+            cache.set_many(
+                {
+                    LOG_KEY.format(number): recipe_id
+                    for number, recipe_id in enumerate(
+                        recipe_ids, end - len(recipe_ids) + 1
+                    )
+                },
+                LOG_TIMEOUT,
+            )
+
+        # Другие процессы должны читать уже сохранённые ингредиенты.
+        transaction.on_commit(write_log)
+
+    @staticmethod
+    def invalidate():
+        """Заставляет все процессы построить индекс заново."""
+        def skip_log():
+            cache.add(LOG_COUNTER_KEY, 0, None)
+            cache.incr(LOG_COUNTER_KEY, MAX_INCREMENTAL_CHANGES + 1)
+
+        transaction.on_commit(skip_log)
+
+    def _build(self, seen):
+        postings = defaultdict(lambda: array('I'))
+        recipes = defaultdict(list)
+        rows = (
+            IngredientToRecipe.objects
+            .values_list('ingredient_id', 'recipe_id')
+            .order_by('ingredient_id', 'recipe_id')
+            .iterator(chunk_size=BUILD_CHUNK_SIZE)
+        )
+        for ingredient_id, recipe_id in rows:
+            postings[ingredient_id].append(recipe_id)
+            recipes[recipe_id].append(ingredient_id)
+        self._postings = postings
+        self._recipes = {
+            recipe_id: tuple(ingredients)
+            for recipe_id, ingredients in recipes.items()
+        }
+        self._seen = seen
+
+    def _update(self, recipe_ids, seen):
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientToRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            ingredients[recipe_id].append(ingredient_id)
+        for recipe_id in recipe_ids:
+            for ingredient_id in self._recipes.pop(recipe_id, ()):
+                posting = self._postings[ingredient_id]
+                position = bisect_left(posting, recipe_id)
+                if (
+                    position < len(posting)
+                    and posting[position] == recipe_id
+                ):
+                    del posting[position]
+            for ingredient_id in ingredients.get(recipe_id, ()):
+                posting = self._postings[ingredient_id]
+                position = bisect_left(posting, recipe_id)
+                if (
+                    position == len(posting)
+                    or posting[position] != recipe_id
+                ):
+                    posting.insert(position, recipe_id)
+            if recipe_id in ingredients:
+                self._recipes[recipe_id] = tuple(ingredients[recipe_id])
+        self._seen = seen
+
+    def _refresh(self):
+        current = cache.get(LOG_COUNTER_KEY, 0)
+        if self._postings is not None and current == self._seen:
+            return
+        if (
+            self._postings is None
+            or not 0 < current - self._seen <= MAX_INCREMENTAL_CHANGES
+        ):
+            self._build(current)
+            return
+        keys = [
+            LOG_KEY.format(number)
+            for number in range(self._seen + 1, current + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            self._build(current)
+            return
+        self._update(set(changes.values()), current)
+
+    def search(self, ingredient_ids):
+        """Возвращает [(recipe_id, не хватает, есть), ...].
+
+        Сначала рецепты, для которых есть всё, затем по возрастанию
+        числа недостающих ингредиентов; рецепты без единого
+        совпадения не возвращаются.
+        """
+        with self._lock:
+            self._refresh()
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self._postings.get(ingredient_id, ()))
+            result = [
+                (recipe_id, len(self._recipes[recipe_id]) - count, count)
+                for recipe_id, count in matched.items()
+            ]
+        result.sort(key=lambda item: (item[1], -item[2], -item[0]))
+        return result
+
+
+cookable_index = CookableIndex()
@@ -0,0 +1,62 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Subscription, User
+from .models import Favorite, Recipe, ShopList
+
+# Поле-счётчик: (модель связи, поле связи, указывающее на объект).
+RECIPE_COUNTERS = {
+    'favorites_count': (Favorite, 'recipe'),
+    'in_carts_count': (ShopList, 'recipe'),
+}
+USER_COUNTERS = {
+    'recipes_count': (Recipe, 'author'),
+    'subscribers_count': (Subscription, 'author'),
+}
+
+
+def count_related(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def change_counter(model, pk, field, delta):
+    # Счётчики неотрицательные: расхождение чинит команда recount.
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def recount(queryset, counters, dry_run=False):
+    """Сверяет счётчики с настоящими количествами и чинит расхождения.
+
+    Возвращает {поле: число объектов с неверным значением}.
+    """
+    drift = {}
+    for field, (model, related_field) in counters.items():
+        actual = count_related(model, related_field)
+        wrong = queryset.alias(actual=actual).filter(
+            ~Q(**{field: F('actual')})
+        )
+        if dry_run:
+            drift[field] = wrong.count()
+        else:
+            drift[field] = queryset.filter(
+                pk__in=wrong.values('pk')
+            ).update(**{field: actual})
+    return drift
+
+
+def recount_all(dry_run=False):
+    return {
+        'recipes': recount(Recipe.objects.all(), RECIPE_COUNTERS, dry_run),
+        'users': recount(User.objects.all(), USER_COUNTERS, dry_run),
+    }
@@ -0,0 +1,174 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps, features
+
+from users.models import User
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Модель -> (поле изображения, поле миниатюры, размер миниатюры).
+IMAGE_FIELDS = {
+    Recipe: ('image', 'image_thumbnail', (544, 418)),
+    User: ('avatar', 'avatar_thumbnail', (96, 96)),
+}
+# Длинная сторона полноразмерного изображения после перекодирования.
+MAX_IMAGE_SIZE = 1600
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def get_image_format():
+    image_format = settings.IMAGE_FORMAT.upper()
+    if image_format == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return image_format
+
+
+def prepare(image, image_format):
+    """Поворачивает по EXIF и приводит режим к поддерживаемому форматом."""
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    if not has_alpha:
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    if image_format == 'WEBP':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def encode(image, image_format):
+    # Метаданные (EXIF, ICC, комментарии) не передаются в save,
+    # поэтому в результат не попадают.
+    buffer = BytesIO()
+    image.save(
+        buffer, image_format, quality=settings.IMAGE_QUALITY, optimize=True
+    )
+    return buffer.getvalue()
+
+
+def render(file, thumbnail_size, image_format):
+    """Байты перекодированного изображения и миниатюры."""
+    with Image.open(file) as source:
+        image = prepare(source, image_format)
+    thumbnail = ImageOps.fit(image, thumbnail_size, Image.LANCZOS)
+    image.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE), Image.LANCZOS)
+    return encode(image, image_format), encode(thumbnail, image_format)
+
+
+def delete_file(model, field_name, name):
+    """Удаляет файл, если на него больше не ссылается ни одна запись."""
+    if not name or model.objects.filter(**{field_name: name}).exists():
+        return
+    model._meta.get_field(field_name).storage.delete(name)
+
+
+def process_image(model, pk, original_name, old_thumbnail=''):
+    """Перекодирует изображение записи и сохраняет миниатюру.
+
+    Тяжёлая работа идёт вне транзакции; если за это время изображение
+    заменили или запись удалили, результат выбрасывается.
+    """
+    field_name, thumbnail_name, thumbnail_size = IMAGE_FIELDS[model]
+    field = model._meta.get_field(field_name)
+    thumbnail_field = model._meta.get_field(thumbnail_name)
+    image_format = get_image_format()
+    extension = EXTENSIONS[image_format]
+    stem = PurePosixPath(original_name).stem
+    with field.storage.open(original_name, 'rb') as file:
+        image_data, thumbnail_data = render(
+            file, thumbnail_size, image_format
+        )
+    new_name = field.storage.save(
+        field.generate_filename(None, f'{stem}.{extension}'),
+        ContentFile(image_data),
+    )
+    new_thumbnail = thumbnail_field.storage.save(
+        thumbnail_field.generate_filename(None, f'{stem}.{extension}'),
+        ContentFile(thumbnail_data),
+    )
+    with transaction.atomic():
+        instance = (
+            model.objects.select_for_update()
+            .filter(pk=pk, **{field_name: original_name})
+            .first()
+        )
+        if instance is not None:
+            if getattr(instance, thumbnail_name):
+                old_thumbnail = getattr(instance, thumbnail_name).name
+            getattr(instance, field_name).name = new_name
+            getattr(instance, thumbnail_name).name = new_thumbnail
+            instance.save(update_fields=[field_name, thumbnail_name])
+    if instance is None:
+        field.storage.delete(new_name)
+        thumbnail_field.storage.delete(new_thumbnail)
+        return
+    delete_file(model, field_name, original_name)
+    delete_file(model, thumbnail_name, old_thumbnail)
+
+
+def run_job(model, pk, original_name, old_thumbnail):
+    try:
+        process_image(model, pk, original_name, old_thumbnail)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать %s %s у %s #%s',
+            IMAGE_FIELDS[model][0], original_name,
+            model._meta.label, pk,
+        )
+
+
+def run_job_in_thread(*args):
+    try:
+        run_job(*args)
+    finally:
+        # У каждого потока пула своё соединение с БД.
+        connection.close()
+
+
+class ImagePipeline:
+    """Пул потоков, обрабатывающий загруженные изображения.
+
+    Файл из запроса сохраняется как есть, а задача ставится в пул
+    после коммита транзакции. При IMAGE_WORKERS = 0 обработка идёт
+    сразу в том же потоке. Незавершённые из-за остановки процесса
+    задачи доделывает команда process_images.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_WORKERS,
+                    thread_name_prefix='images',
+                )
+            return self._executor
+
+    def submit(self, model, pk, original_name, old_thumbnail=''):
+        args = (model, pk, original_name, old_thumbnail)
+
+        def start():
+            if settings.IMAGE_WORKERS:
+                self.executor.submit(run_job_in_thread, *args)
+            else:
+                run_job(*args)
+
+        transaction.on_commit(start)
+
+
+image_pipeline = ImagePipeline()
@@ -1,10 +1,41 @@
+import copy
+import hashlib
+import json
 import os
+from functools import lru_cache
+from io import BytesIO
 
+from django.core.cache import cache
+from fontTools import ttLib
 from fpdf import FPDF, HTMLMixin
+from fpdf.fonts import SubsetMap, TTFFont
 
 from foodgram.settings import BASE_DIR
 
 FONTS_DIR = BASE_DIR / 'recipes/data/fonts'
+FONTS = (
+    ('Comic', '', 'COMIC.TTF'),
+    ('Comic', 'B', 'COMICBD.TTF'),
+    ('Comic', 'I', 'COMICI.TTF'),
+)
+PDF_CACHE_TIMEOUT = 60 * 60
+
+
+@lru_cache(maxsize=None)
+def load_font(family, style, fname):
+    """Разбирает TTF-файл один раз на процесс.
+
+    Возвращает готовый TTFFont с метриками и исходные байты шрифта:
+    при выводе fpdf2 урезает ttfont документа до использованных глифов,
+    поэтому каждому документу нужна своя копия таблиц.
+    """
+    font_path = os.path.join(FONTS_DIR, fname)
+    if not os.path.exists(font_path):
+        raise FileNotFoundError(f"Font file not found: {font_path}")
+    with open(font_path, 'rb') as font_file:
+        data = font_file.read()
+    fontkey = f'{family.lower()}{style}'
+    return TTFFont(FPDF(), font_path, fontkey, style), data
 
 
 class PDF(FPDF, HTMLMixin):
@@ -14,17 +45,25 @@ class PDF(FPDF, HTMLMixin):
         self._set_font()
 
     def _set_font(self) -> None:
-        fonts = [
-            ('Comic', '', 'COMIC.TTF'),
-            ('Comic', 'B', 'COMICBD.TTF'),
-            ('Comic', 'I', 'COMICI.TTF')
-        ]
-        for font in fonts:
-            font_path = os.path.join(FONTS_DIR, font[2])
-            if os.path.exists(font_path):
-                self.add_font(font[0], style=font[1], fname=font_path)
-            else:
-                raise FileNotFoundError(f"Font file not found: {font_path}")
+        # Повторяет FPDF.add_font() из fpdf2 2.7.8, но берёт уже
+        # разобранный шрифт: документу достаются только свои ttfont
+        # и карта подмножества глифов. Код завязан на внутренние поля
+        # TTFont и SubsetMap, поэтому версия fpdf2 закреплена в
+        # requirements.txt; при обновлении сверьте его с add_font() и
+        # прогоните ShoppingListPDFTest.
+        reserved = "\x00 \r\n"
+        if self.str_alias_nb_pages:
+            reserved += "0123456789" + self.str_alias_nb_pages
+        for family, style, fname in FONTS:
+            template, data = load_font(family, style, fname)
+            font = copy.copy(template)
+            font.i = len(self.fonts) + 1
+            font.ttfont = ttLib.TTFont(
+                BytesIO(data), recalcTimestamp=False, fontNumber=0, lazy=True
+            )
+            font.missing_glyphs = []
+            font.subset = SubsetMap(font, [ord(char) for char in reserved])
+            self.fonts[font.fontkey] = font
         self.set_font('Comic')
 
     def header(self) -> None:
@@ -53,7 +92,7 @@ class PDF(FPDF, HTMLMixin):
         return self.output()
 
 
-def make_pdf_file(ingredients, recipes, request):
+def render_pdf_file(ingredients, recipes):
     pdf = PDF()
     pdf.add_page()
     pdf.set_font('Comic', 'I', size=14)
@@ -85,4 +124,24 @@ def make_pdf_file(ingredients, recipes, request):
     pdf.ln(6)
 
     pdf_file = pdf.output(dest='S')
+    return bytes(pdf_file)
+
+
+def get_pdf_cache_key(ingredients, recipes):
+    content = json.dumps(
+        [list(ingredients), list(recipes), os.getenv('FOODGRAM_LINK')],
+        ensure_ascii=False,
+        default=str,
+    )
+    digest = hashlib.sha256(content.encode()).hexdigest()
+    return f'shopping_list_pdf:{digest}'
+
+
+def make_pdf_file(ingredients, recipes, request):
+    ingredients = list(ingredients)
+    cache_key = get_pdf_cache_key(ingredients, recipes)
+    pdf_file = cache.get(cache_key)
+    if pdf_file is None:
+        pdf_file = render_pdf_file(ingredients, recipes)
+        cache.set(cache_key, pdf_file, PDF_CACHE_TIMEOUT)
     return pdf_file
@@ -0,0 +1,63 @@
+from time import perf_counter
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from recipes.make_pdf import (
+    get_pdf_cache_key,
+    load_font,
+    make_pdf_file,
+    render_pdf_file
+)
+
+
+class Command(BaseCommand):
+    help = 'Сравнить время холодной и тёплой генерации PDF списка покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[10, 100, 1000],
+            help='Количество строк ингредиентов в списке.',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз повторять тёплые замеры.',
+        )
+
+    @staticmethod
+    def measure(func, *args):
+        start = perf_counter()
+        func(*args)
+        return (perf_counter() - start) * 1000
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"строк":>6} {"холодный, мс":>14} {"шрифты, мс":>12} '
+            f'{"из кэша, мс":>12}'
+        )
+        for size in options['sizes']:
+            ingredients = [
+                {
+                    'name': f'Ингредиент {number}',
+                    'unit': 'г',
+                    'total_amount': number,
+                }
+                for number in range(size)
+            ]
+            cache.delete(get_pdf_cache_key(ingredients, []))
+            load_font.cache_clear()
+            cold = self.measure(render_pdf_file, ingredients, [])
+            fonts_loaded = min(
+                self.measure(render_pdf_file, ingredients, [])
+                for _ in range(options['repeat'])
+            )
+            make_pdf_file(ingredients, [], None)
+            cached = min(
+                self.measure(make_pdf_file, ingredients, [], None)
+                for _ in range(options['repeat'])
+            )
+            cache.delete(get_pdf_cache_key(ingredients, []))
+            self.stdout.write(
+                f'{size:>6} {cold:>14.1f} {fonts_loaded:>12.1f} '
+                f'{cached:>12.1f}'
+            )
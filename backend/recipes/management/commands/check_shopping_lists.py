@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShopListIngredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверить сохранённые списки покупок с корзинами пользователей '
+        'и пересобрать их.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, не пересобирая таблицу.',
+        )
+
+    def handle(self, *args, **options):
+        expected = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShopListIngredient.calculate_totals().iterator()
+        }
+        stored = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShopListIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            ).iterator()
+        }
+
+        missing = expected.keys() - stored.keys()
+        extra = stored.keys() - expected.keys()
+        changed = {
+            key for key in expected.keys() & stored.keys()
+            if expected[key] != stored[key]
+        }
+        self.stdout.write(
+            f'Строк: ожидается {len(expected)}, сохранено {len(stored)}. '
+            f'Отсутствует: {len(missing)}, лишних: {len(extra)}, '
+            f'с неверным количеством: {len(changed)}.'
+        )
+        for user_id, ingredient_id in sorted(missing | extra | changed):
+            self.stdout.write(
+                f'  user={user_id} ingredient={ingredient_id}: '
+                f'{stored.get((user_id, ingredient_id), 0)} -> '
+                f'{expected.get((user_id, ingredient_id), 0)}'
+            )
+
+        if options['dry_run']:
+            return
+
+        with transaction.atomic():
+            ShopListIngredient.objects.all().delete()
+            ShopListIngredient.objects.bulk_create(
+                [
+                    ShopListIngredient(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=total_amount,
+                    )
+                    for (user_id, ingredient_id), total_amount
+                    in expected.items()
+                ],
+                batch_size=1000,
+            )
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересобраны.'))
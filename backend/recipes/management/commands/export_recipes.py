@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from recipes.models import IngredientToRecipe, Recipe
+
+RECIPES_FILE = 'recipes.ndjson'
+IMAGES_DIR = 'images'
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгрузить рецепты в архив: recipes.ndjson (по рецепту в строке) '
+        'и папку images с изображениями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Папка архива.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько рецептов читать из БД за один запрос.',
+        )
+        parser.add_argument(
+            '--no-images', action='store_true',
+            help='Не копировать файлы изображений.',
+        )
+
+    def handle(self, *args, **options):
+        images_dir = os.path.join(options['path'], IMAGES_DIR)
+        os.makedirs(images_dir, exist_ok=True)
+        recipes = (
+            Recipe.objects.select_related('author')
+            .prefetch_related(
+                'tags',
+                Prefetch(
+                    'ingredient_to_recipe',
+                    queryset=IngredientToRecipe.objects.select_related(
+                        'ingredient'
+                    )
+                ),
+            )
+            .order_by('id')
+            .iterator(chunk_size=options['chunk_size'])
+        )
+        exported = 0
+        path = os.path.join(options['path'], RECIPES_FILE)
+        with open(path, 'w', encoding='utf-8') as file:
+            for recipe in recipes:
+                image = None
+                if not options['no_images']:
+                    image = self.export_image(recipe, images_dir)
+                file.write(
+                    json.dumps(self.to_record(recipe, image),
+                               ensure_ascii=False) + '\n'
+                )
+                exported += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {exported}.'
+        ))
+
+    @staticmethod
+    def to_record(recipe, image):
+        return {
+            'author': recipe.author.username,
+            'name': recipe.name,
+            'text': recipe.text,
+            'description': recipe.description,
+            'cooking_time': recipe.cooking_time,
+            'pub_date': recipe.pub_date.isoformat(),
+            'image': image,
+            'tags': [tag.slug for tag in recipe.tags.all()],
+            'ingredients': [
+                {
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.ingredient_to_recipe.all()
+            ],
+        }
+
+    def export_image(self, recipe, images_dir):
+        if not recipe.image:
+            return None
+        name = f'{recipe.pk}{os.path.splitext(recipe.image.name)[1]}'
+        try:
+            with recipe.image.open('rb') as source, open(
+                os.path.join(images_dir, name), 'wb'
+            ) as target:
+                shutil.copyfileobj(source, target)
+        except OSError:
+            self.stderr.write(
+                f'Не найдено изображение рецепта {recipe.pk}: '
+                f'{recipe.image.name}'
+            )
+            return None
+        return f'{IMAGES_DIR}/{name}'
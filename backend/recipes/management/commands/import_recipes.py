@@ -0,0 +1,229 @@
+import base64
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from time import perf_counter
+from uuid import uuid4
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from PIL import Image
+
+from recipes.counters import USER_COUNTERS, recount
+from recipes.models import (
+    Ingredient,
+    IngredientToRecipe,
+    Recipe,
+    Tag,
+    TagToRecipe,
+    make_text_hash
+)
+from recipes.signals import bulk_changed, ingredients_changed
+from users.models import User
+
+from .export_recipes import RECIPES_FILE
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_TO = Recipe._meta.get_field('image').upload_to
+NAME_MAX_LENGTH = Recipe._meta.get_field('name').max_length
+MIN_VALUE = 1
+MAX_VALUE = 1000
+
+
+def store_image(archive_dir, source):
+    """Проверяет изображение и сохраняет его в хранилище.
+
+    Выполняется в дочернем процессе. source — путь внутри архива
+    или data:-строка с Base64, как в API. Возвращает имя файла
+    в хранилище или None, если изображение не читается.
+    """
+    try:
+        if source.startswith('data:'):
+            header, data = source.split(';base64,', 1)
+            extension = header.rsplit('/', 1)[-1]
+            content = base64.b64decode(data)
+        else:
+            extension = os.path.splitext(source)[1].lstrip('.')
+            with open(os.path.join(archive_dir, source), 'rb') as file:
+                content = file.read()
+        with Image.open(ContentFile(content)) as image:
+            image.verify()
+    except (OSError, ValueError, SyntaxError):
+        return None
+    return default_storage.save(
+        f'{UPLOAD_TO}{uuid4().hex}.{extension}', ContentFile(content)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузить рецепты из архива export_recipes. Рецепты вставляются '
+        'пачками, изображения обрабатываются в нескольких процессах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Папка архива.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько рецептов вставлять в одной транзакции.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Количество процессов для обработки изображений.',
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.join(options['path'], RECIPES_FILE)
+        if not os.path.exists(path):
+            raise CommandError(f'Файл не найден по пути: {path}')
+        self.authors = dict(User.objects.values_list('username', 'id'))
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        self.imported = self.skipped = 0
+        self.workers = options['workers']
+        start = perf_counter()
+        # Дочерние процессы не должны наследовать открытое соединение.
+        connection.close()
+        with open(path, 'r', encoding='utf-8') as file, ProcessPoolExecutor(
+            options['workers']
+        ) as executor:
+            store = partial(store_image, options['path'])
+            lines = (line for line in file if line.strip())
+            while True:
+                chunk = list(islice(lines, options['chunk_size']))
+                if not chunk:
+                    break
+                self.import_chunk(chunk, executor, store)
+        if self.imported:
+            for model in (Recipe, TagToRecipe, IngredientToRecipe):
+                bulk_changed.send(sender=model)
+        elapsed = perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {self.imported}, пропущено: '
+            f'{self.skipped} за {elapsed:.2f} с '
+            f'({self.imported / elapsed if elapsed else 0:.0f} рецептов/с).'
+        ))
+
+    def clean_record(self, line):
+        try:
+            record = json.loads(line)
+            author = self.authors[record['author']]
+            tags = {self.tags[slug] for slug in record['tags']}
+            ingredients = {}
+            for item in record['ingredients']:
+                key = (item['name'], item['measurement_unit'])
+                amount = int(item['amount'])
+                if not MIN_VALUE <= amount <= MAX_VALUE:
+                    raise ValueError(f'количество {amount}')
+                ingredients.setdefault(self.ingredients[key], amount)
+            cooking_time = int(record['cooking_time'])
+            if not MIN_VALUE <= cooking_time <= MAX_VALUE:
+                raise ValueError(f'время приготовления {cooking_time}')
+            if not record['name'] or len(record['name']) > NAME_MAX_LENGTH:
+                raise ValueError('название')
+            if not record['text'] or not record['image']:
+                raise ValueError('нет описания или изображения')
+            if not tags or not ingredients:
+                raise ValueError('нет тегов или ингредиентов')
+        except (KeyError, TypeError, ValueError) as error:
+            logger.warning(f'Неверный рецепт пропущен ({error}): {line[:80]}')
+            return None
+        return {
+            'recipe': Recipe(
+                author_id=author,
+                name=record['name'],
+                text=record['text'],
+                text_hash=make_text_hash(record['text']),
+                description=record.get('description') or record['text'],
+                cooking_time=cooking_time,
+            ),
+            'pub_date': parse_datetime(record.get('pub_date') or ''),
+            'image': record['image'],
+            'tags': tags,
+            'ingredients': ingredients,
+        }
+
+    def exclude_existing(self, records):
+        existing = set(
+            Recipe.objects.filter(
+                author_id__in={item['recipe'].author_id for item in records},
+                text_hash__in={item['recipe'].text_hash for item in records},
+            ).values_list('author_id', 'text_hash')
+        )
+        unique = []
+        for item in records:
+            key = (item['recipe'].author_id, item['recipe'].text_hash)
+            if key in existing:
+                logger.warning(f'Рецепт уже есть: {item["recipe"].name}')
+                continue
+            existing.add(key)
+            unique.append(item)
+        return unique
+
+    def import_chunk(self, chunk, executor, store):
+        records = [
+            item for item in map(self.clean_record, chunk) if item is not None
+        ]
+        records = self.exclude_existing(records) if records else records
+        images = executor.map(
+            store, [item['image'] for item in records],
+            chunksize=max(1, len(records) // (self.workers * 4)),
+        )
+        valid = []
+        for item, image in zip(records, images):
+            if image is None:
+                logger.warning(
+                    f'Не удалось прочитать изображение: {item["image"][:80]}'
+                )
+                continue
+            item['recipe'].image = image
+            valid.append(item)
+        self.skipped += len(chunk) - len(valid)
+        if not valid:
+            return
+
+        with transaction.atomic():
+            recipes = Recipe.objects.bulk_create(
+                [item['recipe'] for item in valid]
+            )
+            # auto_now_add перезаписывает pub_date при вставке.
+            dated = []
+            for recipe, item in zip(recipes, valid):
+                if item['pub_date'] is not None:
+                    recipe.pub_date = item['pub_date']
+                    dated.append(recipe)
+            Recipe.objects.bulk_update(dated, ['pub_date'])
+            TagToRecipe.objects.bulk_create(
+                TagToRecipe(tag_id=tag, recipe=recipe)
+                for recipe, item in zip(recipes, valid)
+                for tag in item['tags']
+            )
+            IngredientToRecipe.objects.bulk_create(
+                IngredientToRecipe(
+                    ingredient_id=ingredient, recipe=recipe, amount=amount
+                )
+                for recipe, item in zip(recipes, valid)
+                for ingredient, amount in item['ingredients'].items()
+            )
+            ingredients_changed.send(
+                sender=Recipe, recipe_ids=[recipe.pk for recipe in recipes]
+            )
+            recount(
+                User.objects.filter(
+                    pk__in={recipe.author_id for recipe in recipes}
+                ),
+                {'recipes_count': USER_COUNTERS['recipes_count']},
+            )
+        self.imported += len(valid)
@@ -1,52 +1,245 @@
 import csv
+import json
 import logging
 import os
+from itertools import islice
+from time import perf_counter
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from django.db import IntegrityError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
 from recipes.models import Ingredient
+from recipes.signals import bulk_changed
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_PATH = os.path.join(settings.BASE_DIR, 'recipes/data/ingredients.csv')
+FORMATS = ('csv', 'json', 'jsonl')
+READ_SIZE = 64 * 1024
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if len(row) == 2:
+            yield row
+        else:
+            yield None, row
+
+
+def iter_json_array(file):
+    """Читает JSON-массив объектов по частям, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer:
+        return
+    if not buffer.startswith('['):
+        raise CommandError('JSON-файл должен содержать массив объектов.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        while not buffer:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('JSON-массив не закрыт.')
+            buffer = chunk.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный JSON.')
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield item
+
+
+def iter_json_lines(file):
+    for line in file:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # Битая строка не словарь: clean_rows учтёт её как неверную.
+            yield line
+
+
+def iter_json(file, lines=False):
+    items = iter_json_lines(file) if lines else iter_json_array(file)
+    for item in items:
+        if isinstance(item, dict):
+            yield item.get('name'), item.get('measurement_unit')
+        else:
+            yield None, item
+
+
+class CopySource:
+    """Файлоподобный объект для COPY: отдаёт строки CSV по мере чтения."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ''
+        self.writer = csv.writer(self)
+
+    def write(self, data):
+        self.buffer += data
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
 
 class Command(BaseCommand):
-    help = 'Загрузить данные об ингредиентах из CSV-файла в БД.'
+    help = (
+        'Загрузить ингредиенты в БД из CSV, JSON или JSON Lines. '
+        'Файл читается частями, существующие ингредиенты пропускаются.'
+    )
 
-    def handle(self, *args, **kwargs):
-        csv_file_path = os.path.join(
-            settings.BASE_DIR,
-            'recipes/data/ingredients.csv'
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=[DEFAULT_PATH],
+            help='Файлы с ингредиентами (по умолчанию ingredients.csv).',
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла, если его нельзя определить по расширению.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Сколько строк вставлять за один запрос.',
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY в PostgreSQL.',
         )
 
-        if not os.path.exists(csv_file_path):
-            logger.error(
-                f'CSV файл не найден по пути: {csv_file_path}'
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            if not os.path.exists(path):
+                logger.error(f'Файл не найден по пути: {path}')
+                continue
+            file_format = options['format'] or self.get_format(path)
+            self.valid = self.invalid = 0
+            start = perf_counter()
+            with open(path, 'r', encoding='utf-8') as file:
+                rows = self.clean_rows(self.read_rows(file, file_format))
+                if self.can_copy(options):
+                    inserted = self.load_copy(rows)
+                else:
+                    inserted = self.load_bulk(rows, options['chunk_size'])
+            if inserted:
+                bulk_changed.send(sender=Ingredient)
+            elapsed = perf_counter() - start
+            total = self.valid + self.invalid
+            self.stdout.write(self.style.SUCCESS(
+                f'{os.path.basename(path)}: добавлено {inserted}, '
+                f'уже были в БД {self.valid - inserted}, '
+                f'ошибочных строк {self.invalid}; '
+                f'{total} строк за {elapsed:.2f} с '
+                f'({total / elapsed if elapsed else 0:.0f} строк/с).'
+            ))
+
+    @staticmethod
+    def get_format(path):
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        if extension == 'ndjson':
+            return 'jsonl'
+        if extension not in FORMATS:
+            raise CommandError(
+                f'Не удалось определить формат файла {path}, '
+                'укажите --format.'
             )
-            return
+        return extension
 
-        ingredients_to_create = []
-
-        with open(csv_file_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                if len(row) == 2:
-                    name = row[0].strip()
-                    measurement_unit = row[1].strip()
-                    ingredients_to_create.append(
-                        Ingredient(
-                            name=name,
-                            measurement_unit=measurement_unit
-                        )
-                    )
-                else:
-                    logger.warning(
-                        f'Неверная строка пропущена: {row}'
-                    )
+    @staticmethod
+    def read_rows(file, file_format):
+        if file_format == 'csv':
+            return iter_csv(file)
+        return iter_json(file, lines=file_format == 'jsonl')
 
-        try:
-            Ingredient.objects.bulk_create(ingredients_to_create)
-            logger.info('Ингредиенты успешно добавлены!')
-        except IntegrityError:
-            logger.error('Некоторые ингредиенты уже существуют!')
+    def clean_rows(self, rows):
+        for name, measurement_unit in rows:
+            if not isinstance(name, str) or not isinstance(
+                measurement_unit, str
+            ):
+                self.invalid += 1
+                logger.warning(
+                    f'Неверная строка пропущена: {measurement_unit}'
+                    if name is None else
+                    f'Неверная строка пропущена: {name}, {measurement_unit}'
+                )
+                continue
+            name = name.strip()
+            measurement_unit = measurement_unit.strip()
+            if (
+                not name or not measurement_unit
+                or len(name) > NAME_MAX_LENGTH
+                or len(measurement_unit) > UNIT_MAX_LENGTH
+            ):
+                self.invalid += 1
+                logger.warning(
+                    f'Неверная строка пропущена: {name}, {measurement_unit}'
+                )
+                continue
+            self.valid += 1
+            yield name, measurement_unit
+
+    @staticmethod
+    def can_copy(options):
+        if options['no_copy'] or connection.vendor != 'postgresql':
+            return False
+        with connection.cursor() as cursor:
+            return hasattr(cursor.cursor, 'copy_expert')
+
+    @staticmethod
+    def load_bulk(rows, chunk_size):
+        before = Ingredient.objects.count()
+        while True:
+            chunk = [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in islice(rows, chunk_size)
+            ]
+            if not chunk:
+                break
+            with transaction.atomic():
+                Ingredient.objects.bulk_create(chunk, ignore_conflicts=True)
+        return Ingredient.objects.count() - before
+
+    @staticmethod
+    def load_copy(rows):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging ('
+                f'name varchar({NAME_MAX_LENGTH}), '
+                f'measurement_unit varchar({UNIT_MAX_LENGTH})'
+                ') ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_staging (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                CopySource(rows),
+                size=READ_SIZE,
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_staging '
+                'ON CONFLICT ON CONSTRAINT unique_name_measurement_unit '
+                'DO NOTHING'
+            )
+            return cursor.rowcount
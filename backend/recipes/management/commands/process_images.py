@@ -0,0 +1,56 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from recipes.images import IMAGE_FIELDS, process_image
+
+logger = logging.getLogger(__name__)
+
+
+def process(job):
+    try:
+        process_image(*job)
+    except Exception:
+        logger.exception('Не удалось обработать %s', job[2])
+        return False
+    finally:
+        connection.close()
+    return True
+
+
+class Command(BaseCommand):
+    help = (
+        'Перекодировать изображения рецептов и аватары без миниатюр '
+        '(например, после import_recipes или остановки воркера).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Обработать заново и изображения с миниатюрами.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько потоков использовать.',
+        )
+
+    def handle(self, *args, **options):
+        jobs = []
+        for model, (field_name, thumbnail_name, _) in IMAGE_FIELDS.items():
+            queryset = model.objects.exclude(**{field_name: ''}).exclude(
+                **{f'{field_name}__isnull': True}
+            )
+            if not options['all']:
+                queryset = queryset.filter(**{thumbnail_name: ''})
+            jobs += [
+                (model, pk, name)
+                for pk, name in queryset.values_list('pk', field_name)
+            ]
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            results = list(executor.map(process, jobs))
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {sum(results)}, '
+            f'с ошибками: {len(results) - sum(results)}.'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount_all
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитать счётчики избранного, списков покупок, рецептов '
+        'и подписчиков и исправить расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько значений неверны.',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = recount_all(options['dry_run'])
+        for model, fields in drift.items():
+            for field, wrong in fields.items():
+                self.stdout.write(
+                    f'{model}.{field}: неверных значений {wrong}'
+                )
+        if options['dry_run']:
+            return
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
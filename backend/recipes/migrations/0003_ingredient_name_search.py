@@ -0,0 +1,54 @@
+# Generated by Django 4.2.15 on 2026-10-18 02:25
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """AddIndex, который вне PostgreSQL меняет только состояние."""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+
+class CreateTrigramExtension(TrigramExtension):
+    """Django проверяет СУБД только при создании расширения."""
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_shoplistingredient'),
+    ]
+
+    operations = [
+        CreateTrigramExtension(),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(Lower('name'), name='ingredient_name_lower_idx'),
+        ),
+        AddPostgresIndex(
+            model_name='ingredient',
+            index=GinIndex(OpClass(Lower('name'), name='gin_trgm_ops'), name='ingredient_name_trgm_idx'),
+        ),
+    ]
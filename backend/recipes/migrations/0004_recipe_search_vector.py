@@ -0,0 +1,81 @@
+# Generated by Django 4.2.15 on 2026-10-18 02:35
+
+from functools import reduce
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+# Копия recipes.search на момент миграции: дальнейшие правки модуля
+# не должны менять уже применённую миграцию.
+SEARCH_CONFIGS = ('russian', 'english')
+FTS_TABLE = 'recipes_recipe_fts'
+FILL_FTS_SQL = (
+    f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+    'SELECT r.id, r.name, r.text, ('
+    'SELECT group_concat(i.name, \' \') '
+    'FROM recipes_ingredienttorecipe ri '
+    'JOIN recipes_ingredient i ON i.id = ri.ingredient_id '
+    'WHERE ri.recipe_id = r.id'
+    ') FROM recipes_recipe r'
+)
+
+
+def fill_search_vector(apps):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    IngredientToRecipe = apps.get_model('recipes', 'IngredientToRecipe')
+    ingredient_names = Subquery(
+        IngredientToRecipe.objects.filter(recipe=OuterRef('pk'))
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    Recipe.objects.update(search_vector=reduce(
+        lambda vector, part: vector + part,
+        (
+            SearchVector('name', weight='A', config=config)
+            + SearchVector('text', weight='B', config=config)
+            + SearchVector(ingredient_names, weight='C', config=config)
+            for config in SEARCH_CONFIGS
+        ),
+    ))
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        fill_search_vector(apps)
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+            'USING fts5(name, text, ingredients)'
+        )
+        schema_editor.execute(FILL_FTS_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_ingredient_name_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector_gin'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.15 on 2026-10-18 02:54
+
+import hashlib
+import unicodedata
+
+from django.db import migrations, models
+
+
+def make_text_hash(text):
+    # Копия recipes.models.make_text_hash на момент миграции.
+    normalized = ' '.join(
+        unicodedata.normalize('NFKC', text).casefold().split()
+    )
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def fill_text_hash(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    recipes = list(
+        Recipe.objects.only('id', 'author_id', 'text').order_by('id')
+    )
+    seen = set()
+    for recipe in recipes:
+        text_hash = make_text_hash(recipe.text)
+        if (recipe.author_id, text_hash) in seen:
+            # Описания, совпадающие после нормализации, остаются, но
+            # дубликатом считается только первое из них. Recipe.save
+            # пересчитывает хэш, только когда описание меняется.
+            text_hash = make_text_hash(f'{recipe.text}#{recipe.pk}')
+        seen.add((recipe.author_id, text_hash))
+        recipe.text_hash = text_hash
+    Recipe.objects.bulk_update(recipes, ['text_hash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_image_thumbnail'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='recipe',
+            name='unique_text_author',
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='text_hash',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(fill_text_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='recipe',
+            name='text_hash',
+            field=models.CharField(editable=False, max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='recipe',
+            constraint=models.UniqueConstraint(fields=('text_hash', 'author'), name='unique_text_hash_author'),
+        ),
+    ]
@@ -1,10 +1,16 @@
+import hashlib
+import unicodedata
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import (
     MaxValueValidator, MinValueValidator, RegexValidator
 )
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from colorfield.fields import ColorField
 
-from users.models import User
+from users.models import Subscription, User
 
 
 class Tag(models.Model):
@@ -43,11 +49,74 @@ class Ingredient(models.Model):
                 name='unique_name_measurement_unit'
             )
         ]
+        # Поиск по вхождению в названии (IngredientFilter) и сортировка
+        # по lower(name). Триграммный индекс есть только в PostgreSQL.
+        indexes = [
+            models.Index(Lower('name'), name='ingredient_name_lower_idx'),
+            GinIndex(
+                OpClass(Lower('name'), name='gin_trgm_ops'),
+                name='ingredient_name_trgm_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name[:10]} {self.measurement_unit}'
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def for_reading(self, user):
+        if user.is_anonymous:
+            authors = User.objects.annotate(
+                is_subscribed=models.Value(False)
+            )
+        else:
+            authors = User.objects.annotate(
+                is_subscribed=models.Exists(
+                    Subscription.objects.filter(
+                        subscriber=user, author=models.OuterRef('pk')
+                    )
+                )
+            )
+        return self.with_user_flags(user).prefetch_related(
+            models.Prefetch('author', queryset=authors),
+            'tags',
+            models.Prefetch(
+                'ingredient_to_recipe',
+                queryset=IngredientToRecipe.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+    def with_user_flags(self, user):
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorite.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShopList.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+        )
+
+
+def make_text_hash(text) -> str:
+    """sha256 описания без учёта регистра и лишних пробелов."""
+    normalized = ' '.join(
+        unicodedata.normalize('NFKC', text).casefold().split()
+    )
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, verbose_name='автор',
@@ -55,7 +124,12 @@ class Recipe(models.Model):
     )
     name = models.CharField('Название', max_length=200)
     text = models.TextField('Описание')
+    text_hash = models.CharField(max_length=64, editable=False)
     image = models.ImageField('Изображение', upload_to='recipes/image/')
+    image_thumbnail = models.ImageField(
+        'Миниатюра', upload_to='recipes/thumbnails/', blank=True,
+        editable=False
+    )
     description = models.TextField('Описание')
     cooking_time = models.PositiveSmallIntegerField(
         'Время приготовления в минутах',
@@ -81,21 +155,71 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = ('Рецепт')
         verbose_name_plural = ('Рецепты')
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            # Полнотекстовый поиск. SQLite создаёт обычный индекс, а ищет
+            # по таблице FTS5.
+            GinIndex(
+                fields=['search_vector'], name='recipe_search_vector_gin'
+            ),
+        ]
         constraints = [
+            # text_hash первым: индекс нужен и для поиска дубликатов
+            # описания среди всех рецептов.
             models.UniqueConstraint(
-                fields=['text', 'author'],
-                name='unique_text_author'
+                fields=['text_hash', 'author'],
+                name='unique_text_hash_author'
             )
         ]
 
     def __str__(self):
         return self.name[:10]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_text = instance.__dict__.get('text')
+        return instance
+
+    def save(self, *args, update_fields=None, **kwargs):
+        # Хэш пересчитывается, только если описание изменилось: у
+        # дубликатов, оставшихся с миграции 0009, хэш «подсолен» id.
+        text = self.__dict__.get('text')
+        if (
+            text is not None
+            and text != getattr(self, '_loaded_text', None)
+            and (update_fields is None or 'text' in update_fields)
+        ):
+            self.text_hash = make_text_hash(text)
+            if update_fields is not None:
+                update_fields = {*update_fields, 'text_hash'}
+        super().save(*args, update_fields=update_fields, **kwargs)
+        self._loaded_text = text
+
 
 class TagToRecipe(models.Model):
     tag = models.ForeignKey(
@@ -206,13 +330,143 @@ class ShopList(ShoppingCart):
     @classmethod
     def get_shopping_ingredients(cls, user):
         return (
-            IngredientToRecipe.objects.filter(
-                recipe__in=cls.objects.filter(user=user).values('recipe')
-            )
-            .values(name=models.F('ingredient__name'))
-            .annotate(
+            ShopListIngredient.objects.filter(user=user)
+            .values(
+                'total_amount',
+                name=models.F('ingredient__name'),
                 unit=models.F('ingredient__measurement_unit'),
-                total_amount=models.Sum('amount'),
             )
             .order_by('ingredient__name')
         )
+
+
+class ShopListIngredient(models.Model):
+    """Сумма ингредиентов рецептов из корзины пользователя.
+
+    Поддерживается инкрементально при изменении корзины и состава
+    рецептов, пересобирается командой check_shopping_lists.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='ингредиент',
+    )
+    total_amount = models.IntegerField('Количество', default=0)
+
+    class Meta:
+        default_related_name = 'shopping_list_ingredients'
+        verbose_name = 'ингредиент корзины'
+        verbose_name_plural = 'Ингредиенты корзины'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shoplist_user_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} :: {self.ingredient} - {self.total_amount}'
+
+    @staticmethod
+    def get_recipe_amounts(recipe):
+        return dict(
+            IngredientToRecipe.objects.filter(recipe=recipe)
+            .values_list('ingredient_id', 'amount')
+        )
+
+    @staticmethod
+    def get_recipes_amounts(recipe_ids):
+        return dict(
+            IngredientToRecipe.objects.filter(recipe_id__in=recipe_ids)
+            .values_list('ingredient_id')
+            .annotate(total_amount=models.Sum('amount'))
+            .order_by()
+        )
+
+    @classmethod
+    def calculate_totals(cls):
+        return (
+            IngredientToRecipe.objects.filter(
+                recipe__shopping_list__isnull=False
+            )
+            .values_list('recipe__shopping_list__user', 'ingredient')
+            .annotate(total_amount=models.Sum('amount'))
+            .order_by()
+        )
+
+    @classmethod
+    def apply_amounts(cls, user_ids, amounts):
+        """Прибавляет {ingredient_id: amount} к спискам пользователей."""
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        user_ids = list(user_ids)
+        if not amounts or not user_ids:
+            return
+        rows = cls.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=amounts
+        )
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [
+                    cls(user_id=user_id, ingredient_id=ingredient_id)
+                    for user_id in user_ids for ingredient_id in amounts
+                ],
+                ignore_conflicts=True,
+            )
+            rows.update(
+                total_amount=models.F('total_amount') + models.Case(
+                    *[
+                        models.When(
+                            ingredient_id=ingredient_id,
+                            then=models.Value(amount)
+                        )
+                        for ingredient_id, amount in amounts.items()
+                    ],
+                    default=models.Value(0),
+                )
+            )
+            rows.filter(total_amount__lte=0).delete()
+
+    @classmethod
+    def add_recipe(cls, user_id, recipe):
+        cls.apply_amounts([user_id], cls.get_recipe_amounts(recipe))
+
+    @classmethod
+    def remove_recipe(cls, user_id, recipe):
+        cls.apply_amounts([user_id], {
+            ingredient_id: -amount
+            for ingredient_id, amount
+            in cls.get_recipe_amounts(recipe).items()
+        })
+
+    @classmethod
+    def add_recipes(cls, user_id, recipe_ids):
+        cls.apply_amounts([user_id], cls.get_recipes_amounts(recipe_ids))
+
+    @classmethod
+    def remove_recipes(cls, user_id, recipe_ids):
+        cls.apply_amounts([user_id], {
+            ingredient_id: -amount
+            for ingredient_id, amount
+            in cls.get_recipes_amounts(recipe_ids).items()
+        })
+
+    @classmethod
+    def update_recipe(cls, recipe, old_amounts):
+        """Переносит изменение состава рецепта в корзины с этим рецептом."""
+        amounts = cls.get_recipe_amounts(recipe)
+        for ingredient_id, amount in old_amounts.items():
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) - amount
+        cls.apply_amounts(
+            ShopList.objects.filter(recipe=recipe)
+            .values_list('user_id', flat=True),
+            amounts,
+        )
@@ -0,0 +1,121 @@
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector
+)
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIGS = ('russian', 'english')
+# В SQLite вместо столбца search_vector используется таблица FTS5.
+FTS_TABLE = 'recipes_recipe_fts'
+FTS_BATCH_SIZE = 500
+# Аннотация с релевантностью, по которой сортирует search_recipes.
+SEARCH_RANK = 'search_rank'
+
+
+def make_search_vector(model):
+    """Вектор из названия (A), описания (B) и ингредиентов (C) рецепта."""
+    ingredient_names = Subquery(
+        model._meta.get_field('ingredient_to_recipe').related_model.objects
+        .filter(recipe=OuterRef('pk'))
+        .values('recipe')
+        .annotate(names=StringAgg('ingredient__name', ' '))
+        .values('names')
+    )
+    return reduce(
+        lambda vector, part: vector + part,
+        (
+            SearchVector('name', weight='A', config=config)
+            + SearchVector('text', weight='B', config=config)
+            + SearchVector(ingredient_names, weight='C', config=config)
+            for config in SEARCH_CONFIGS
+        ),
+    )
+
+
+def update_search_vector(queryset):
+    """Пересчитывает поисковый индекс для рецептов из queryset.
+
+    Принимает и исторические модели, поэтому вызывается из миграций.
+    """
+    if connection.vendor == 'postgresql':
+        queryset.update(search_vector=make_search_vector(queryset.model))
+    elif connection.vendor == 'sqlite':
+        update_fts(queryset)
+
+
+def update_fts(queryset):
+    meta = queryset.model._meta
+    through = meta.get_field('ingredient_to_recipe').related_model._meta
+    ingredient = through.get_field('ingredient').related_model._meta
+    ids = list(queryset.values_list('pk', flat=True))
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), FTS_BATCH_SIZE):
+            batch = ids[start:start + FTS_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                batch,
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+                f'SELECT r.id, r.name, r.text, ('
+                f'SELECT group_concat(i.name, \' \') '
+                f'FROM {through.db_table} ri '
+                f'JOIN {ingredient.db_table} i ON i.id = ri.ingredient_id '
+                f'WHERE ri.recipe_id = r.id'
+                f') FROM {meta.db_table} r WHERE r.id IN ({placeholders})',
+                batch,
+            )
+
+
+def delete_from_fts(recipe_id):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+        )
+
+
+def search_recipes(queryset, value):
+    """Оставляет рецепты, подходящие под запрос, лучшие — первыми."""
+    if connection.vendor == 'sqlite':
+        return search_fts(queryset, value)
+    query = reduce(or_, (
+        SearchQuery(value, config=config, search_type='websearch')
+        for config in SEARCH_CONFIGS
+    ))
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(**{SEARCH_RANK: SearchRank(F('search_vector'), query)})
+        .order_by(f'-{SEARCH_RANK}', '-pub_date')
+    )
+
+
+def search_fts(queryset, value):
+    # Каждое слово ищется по началу, слова объединяются через AND.
+    match = ' '.join(
+        '"{}"*'.format(word.replace('"', '""')) for word in value.split()
+    )
+    if not match:
+        return queryset
+    table = queryset.model._meta.db_table
+    return (
+        queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [match],
+        ))
+        .annotate(**{SEARCH_RANK: RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 5.0, 2.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+            [match],
+        )})
+        .order_by(f'-{SEARCH_RANK}', '-pub_date')
+    )
@@ -0,0 +1,69 @@
+import csv
+import json
+from itertools import islice
+
+TEXT_TITLE = 'Купить в магазине:'
+CSV_HEADER = ('Ингредиент', 'Единица измерения', 'Количество')
+ROWS_PER_CHUNK = 500
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def batched(ingredients, size=ROWS_PER_CHUNK):
+    ingredients = iter(ingredients)
+    while batch := list(islice(ingredients, size)):
+        yield batch
+
+
+def iter_text(ingredients):
+    yield TEXT_TITLE
+    for batch in batched(ingredients):
+        yield ''.join(
+            '\n{name} ({unit}) - {total_amount}'.format(**ingredient)
+            for ingredient in batch
+        )
+
+
+def iter_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for batch in batched(ingredients):
+        yield ''.join(
+            writer.writerow([
+                ingredient['name'],
+                ingredient['unit'],
+                ingredient['total_amount'],
+            ])
+            for ingredient in batch
+        )
+
+
+def iter_json(ingredients):
+    yield '['
+    separator = ''
+    for batch in batched(ingredients):
+        yield separator + ','.join(
+            json.dumps(
+                {
+                    'name': ingredient['name'],
+                    'unit': ingredient['unit'],
+                    'total_amount': ingredient['total_amount'],
+                },
+                ensure_ascii=False,
+            )
+            for ingredient in batch
+        )
+        separator = ','
+    yield ']'
+
+
+EXPORT_FORMATS = {
+    'txt': ('text/plain', iter_text),
+    'csv': ('text/csv', iter_csv),
+    'json': ('application/json', iter_json),
+}
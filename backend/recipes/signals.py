@@ -0,0 +1,177 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+from django.dispatch import Signal, receiver
+
+from users.models import Subscription, User
+from .autocomplete import ingredient_index
+from .cookable import cookable_index
+from .counters import RECIPE_COUNTERS, change_counter, recount
+from .images import IMAGE_FIELDS, delete_file, image_pipeline
+from .models import (
+    Favorite,
+    Ingredient,
+    IngredientToRecipe,
+    Recipe,
+    ShopList,
+    ShopListIngredient
+)
+from .search import delete_from_fts, update_search_vector
+
+# bulk_create/update() не шлют post_save: после массовых изменений
+# отправитель (модель) сообщает о них этим сигналом.
+bulk_changed = Signal()
+# Ингредиенты рецептов пишутся через bulk_create, поэтому после записи
+# отправляется ingredients_changed(sender=Recipe, recipe_ids=[...]).
+ingredients_changed = Signal()
+# Пакетное добавление и удаление рецептов в избранном и корзине идёт
+# мимо post_save/post_delete: user_lists_changed(sender=Favorite или
+# ShopList, user_id=..., recipe_ids=[...], added=True/False).
+user_lists_changed = Signal()
+# Внутри batch_changes() построчные получатели избранного и корзины
+# ничего не делают: всю пачку разом обрабатывает user_lists_changed.
+in_batch = ContextVar('in_batch', default=False)
+
+
+@contextmanager
+def batch_changes():
+    token = in_batch.set(True)
+    try:
+        yield
+    finally:
+        in_batch.reset(token)
+
+
+@receiver(post_save, sender=ShopList)
+def add_recipe_to_shopping_list(sender, instance, created, **kwargs):
+    if created and not in_batch.get():
+        ShopListIngredient.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShopList)
+def remove_recipe_from_shopping_list(sender, instance, **kwargs):
+    if not in_batch.get():
+        ShopListIngredient.remove_recipe(
+            instance.user_id, instance.recipe_id
+        )
+
+
+@receiver(user_lists_changed, sender=ShopList)
+def update_shopping_list(sender, user_id, recipe_ids, added, **kwargs):
+    if added:
+        ShopListIngredient.add_recipes(user_id, recipe_ids)
+    else:
+        ShopListIngredient.remove_recipes(user_id, recipe_ids)
+
+
+@receiver(user_lists_changed, sender=Favorite)
+@receiver(user_lists_changed, sender=ShopList)
+def recount_recipe_lists(sender, recipe_ids, **kwargs):
+    recount(Recipe.objects.filter(pk__in=recipe_ids), {
+        field: counter for field, counter in RECIPE_COUNTERS.items()
+        if counter[0] is sender
+    })
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(bulk_changed, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, created,
+                                update_fields=None, **kwargs):
+    # Вектор нового рецепта считается по ingredients_changed,
+    # когда ингредиенты уже добавлены.
+    if created or (update_fields and not {'name', 'text'} & update_fields):
+        return
+    update_search_vector(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(ingredients_changed, sender=Recipe)
+def update_recipe_ingredients(sender, recipe_ids, **kwargs):
+    update_search_vector(Recipe.objects.filter(pk__in=recipe_ids))
+    cookable_index.mark_changed(recipe_ids)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_search_vector(sender, instance, **kwargs):
+    delete_from_fts(instance.pk)
+    cookable_index.mark_changed([instance.pk])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search_vectors(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vector(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_delete, sender=Ingredient)
+@receiver(bulk_changed, sender=IngredientToRecipe)
+def invalidate_cookable_index(sender, **kwargs):
+    cookable_index.invalidate()
+
+
+# Счётчики обновляются одним UPDATE с F(), без чтения строки.
+COUNTERS = (
+    (Favorite, Recipe, 'recipe_id', 'favorites_count'),
+    (ShopList, Recipe, 'recipe_id', 'in_carts_count'),
+    (Recipe, User, 'author_id', 'recipes_count'),
+    (Subscription, User, 'author_id', 'subscribers_count'),
+)
+
+
+def connect_counter(sender, model, pk_field, field):
+    def increment(instance, created, **kwargs):
+        if created and not in_batch.get():
+            change_counter(model, getattr(instance, pk_field), field, 1)
+
+    def decrement(instance, **kwargs):
+        if not in_batch.get():
+            change_counter(model, getattr(instance, pk_field), field, -1)
+
+    post_save.connect(increment, sender=sender, weak=False)
+    post_delete.connect(decrement, sender=sender, weak=False)
+
+
+for counter in COUNTERS:
+    connect_counter(*counter)
+
+
+def mark_new_image(sender, instance, **kwargs):
+    field_name, thumbnail_name, _ = IMAGE_FIELDS[sender]
+    image = getattr(instance, field_name)
+    thumbnail = getattr(instance, thumbnail_name)
+    if (image and image._committed) or not (image or thumbnail):
+        return
+    # Изображение загружено или удалено — миниатюра больше не подходит.
+    instance._old_thumbnail = thumbnail.name or ''
+    setattr(instance, thumbnail_name, '')
+
+
+def process_new_image(sender, instance, **kwargs):
+    old_thumbnail = instance.__dict__.pop('_old_thumbnail', None)
+    if old_thumbnail is None:
+        return
+    field_name, thumbnail_name, _ = IMAGE_FIELDS[sender]
+    image = getattr(instance, field_name)
+    if image:
+        image_pipeline.submit(sender, instance.pk, image.name, old_thumbnail)
+    elif old_thumbnail:
+        transaction.on_commit(
+            lambda: delete_file(sender, thumbnail_name, old_thumbnail)
+        )
+
+
+for model in IMAGE_FIELDS:
+    pre_save.connect(mark_new_image, sender=model)
+    post_save.connect(process_new_image, sender=model)
@@ -0,0 +1,214 @@
+import re
+import zlib
+from io import BytesIO
+
+from django.test import TestCase
+from fontTools import ttLib
+from rest_framework.test import APIClient
+
+from users.models import User
+from .make_pdf import render_pdf_file
+from .models import (
+    Ingredient,
+    IngredientToRecipe,
+    Recipe,
+    ShopList,
+    ShopListIngredient
+)
+
+
+class ShopListIngredientTest(TestCase):
+    """Итоги списка покупок совпадают с подсчётом с нуля."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Автор', last_name='Автор', password='password',
+            is_staff=True, is_superuser=True,
+        )
+        cls.buyers = [
+            User.objects.create_user(
+                username=f'buyer{i}', email=f'buyer{i}@example.com',
+                first_name='Покупатель', last_name='Покупатель',
+                password='password',
+            )
+            for i in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г'
+            )
+            for i in range(4)
+        ]
+        cls.recipes = []
+        for i in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=f'Рецепт {i}',
+                text=f'Описание рецепта {i}',
+                description=f'Описание рецепта {i}',
+                cooking_time=10,
+                image='recipes/image/test.png',
+            )
+            IngredientToRecipe.objects.bulk_create(
+                IngredientToRecipe(
+                    recipe=recipe,
+                    ingredient=cls.ingredients[i + j],
+                    amount=10 * (j + 1),
+                )
+                for j in range(3)
+            )
+            cls.recipes.append(recipe)
+
+    def assert_totals(self):
+        expected = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShopListIngredient.calculate_totals()
+        }
+        stored = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShopListIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            )
+        }
+        self.assertEqual(stored, expected)
+        return stored
+
+    def fill_carts(self):
+        for buyer in self.buyers:
+            for recipe in self.recipes:
+                ShopList.objects.create(user=buyer, recipe=recipe)
+
+    def test_add_and_remove_recipe(self):
+        self.fill_carts()
+        stored = self.assert_totals()
+        # Ингредиент 1 есть в обоих рецептах: 20 + 10.
+        self.assertEqual(
+            stored[(self.buyers[0].pk, self.ingredients[1].pk)], 30
+        )
+        ShopList.objects.get(
+            user=self.buyers[0], recipe=self.recipes[0]
+        ).delete()
+        self.assert_totals()
+        ShopList.objects.filter(user=self.buyers[0]).delete()
+        self.assertFalse(
+            ShopListIngredient.objects.filter(user=self.buyers[0]).exists()
+        )
+        self.assert_totals()
+
+    def test_edit_recipe_through_api(self):
+        self.fill_carts()
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(
+            f'/api/recipes/{self.recipes[0].pk}/',
+            {'ingredients': [
+                {'id': self.ingredients[0].pk, 'amount': 5},
+                {'id': self.ingredients[3].pk, 'amount': 7},
+            ]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals()
+
+    def test_edit_recipe_through_admin(self):
+        self.fill_carts()
+        recipe = self.recipes[0]
+        rows = list(recipe.ingredient_to_recipe.order_by('pk'))
+        prefix = 'ingredient_to_recipe'
+        data = {
+            'author': self.author.pk,
+            'name': recipe.name,
+            'text': recipe.text,
+            'description': recipe.description,
+            'cooking_time': recipe.cooking_time,
+            f'{prefix}-TOTAL_FORMS': len(rows) + 1,
+            f'{prefix}-INITIAL_FORMS': len(rows),
+            f'{prefix}-MIN_NUM_FORMS': 1,
+            f'{prefix}-MAX_NUM_FORMS': 1000,
+        }
+        for index, row in enumerate(rows):
+            data.update({
+                f'{prefix}-{index}-id': row.pk,
+                f'{prefix}-{index}-recipe': recipe.pk,
+                f'{prefix}-{index}-ingredient': row.ingredient_id,
+                f'{prefix}-{index}-amount': row.amount + 1,
+            })
+        # Первую строку удаляем, новую добавляем.
+        data[f'{prefix}-0-DELETE'] = 'on'
+        data.update({
+            f'{prefix}-{len(rows)}-recipe': recipe.pk,
+            f'{prefix}-{len(rows)}-ingredient': self.ingredients[3].pk,
+            f'{prefix}-{len(rows)}-amount': 4,
+        })
+        self.client.force_login(self.author)
+        response = self.client.post(
+            f'/admin/recipes/recipe/{recipe.pk}/change/', data
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            set(recipe.ingredient_to_recipe.values_list(
+                'ingredient_id', 'amount'
+            )),
+            {
+                (self.ingredients[1].pk, 21),
+                (self.ingredients[2].pk, 31),
+                (self.ingredients[3].pk, 4),
+            },
+        )
+        self.assert_totals()
+
+    def test_delete_recipe(self):
+        self.fill_carts()
+        self.recipes[0].delete()
+        self.assert_totals()
+
+
+class ShoppingListPDFTest(TestCase):
+    """PDF собирается из шрифтов, разобранных один раз на процесс.
+
+    make_pdf копирует внутренние объекты fpdf2 2.7.8, поэтому тест
+    проверяет, что документ читается и подмножества шрифтов у каждого
+    документа свои.
+    """
+
+    @staticmethod
+    def embedded_fonts(pdf):
+        fonts = []
+        for match in re.finditer(rb'(?<!end)stream\r?\n', pdf):
+            raw = pdf[match.end():pdf.index(b'endstream', match.end())]
+            try:
+                data = zlib.decompress(raw)
+            except zlib.error:
+                continue
+            if data[:4] in (b'\x00\x01\x00\x00', b'true'):
+                fonts.append(ttLib.TTFont(BytesIO(data)).getBestCmap())
+        return fonts
+
+    def test_two_page_cyrillic_pdf(self):
+        render_pdf_file(
+            [{'name': 'Альфа', 'unit': 'г', 'total_amount': 1}], []
+        )
+        pdf = render_pdf_file(
+            [
+                {'name': f'Жёлудь {i}', 'unit': 'шт', 'total_amount': i}
+                for i in range(60)
+            ],
+            ['Щи'],
+        )
+        self.assertTrue(pdf.startswith(b'%PDF-'))
+        self.assertTrue(pdf.rstrip().endswith(b'%%EOF'))
+        self.assertEqual(
+            len(re.findall(rb'/Type\s*/Page\b(?!s)', pdf)), 2
+        )
+        fonts = self.embedded_fonts(pdf)
+        self.assertEqual(len(fonts), 3)
+        self.assertTrue(any(
+            all(ord(char) in cmap for char in 'Жёлудь шт')
+            for cmap in fonts
+        ))
+        # Глифы прошлого документа в подмножество не попадают.
+        self.assertFalse(any(ord('ф') in cmap for cmap in fonts))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-18 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='media/avatars/thumbnails', verbose_name='Миниатюра аватара'),
+        ),
+    ]
@@ -24,6 +24,16 @@ class User(AbstractUser):
         null=True,
         upload_to='media/avatars'
     )
+    avatar_thumbnail = models.ImageField(
+        'Миниатюра аватара', upload_to='media/avatars/thumbnails',
+        blank=True, editable=False
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False
+    )
 
     class Meta:
         verbose_name = 'Пользователь'